@@ -1,4 +1,5 @@
 from flask import Flask
+from flask_cors import CORS
 
 # Create Flask app
 app = Flask(
@@ -6,6 +7,7 @@ app = Flask(
     static_folder="../static",      # path to your /static folder
     template_folder="../templates"  # path to your /templates folder
 )
+CORS(app)
 
 # Import routes *after* creating the app
 from app import routes
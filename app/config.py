@@ -0,0 +1,23 @@
+# -------------------------
+# Background jobs (/run-scripts)
+# -------------------------
+# Each run writes its LLM result and PDF to its own folder (see
+# scripts/workspace.py), so several pipelines can run side by side.
+JOB_WORKERS = 4
+JOB_QUEUE_LIMIT = 8      # queued (not yet running) jobs accepted before 429
+JOB_HISTORY_LIMIT = 100  # finished jobs kept in memory for status polling
+
+# -------------------------
+# Room templates (/rooms)
+# -------------------------
+# The payload is built once and kept in memory; the SVG folder is re-checked
+# for added/changed/removed files at most this often.
+ROOM_TEMPLATES_CHECK_SECONDS = 2.0
+
+# -------------------------
+# Startup (python -m app.startup_check)
+# -------------------------
+# Importing the app must stay cheap: no data processing, and the heavy
+# stage modules below are only imported when a pipeline stage runs.
+STARTUP_BUDGET_SECONDS = 1.0
+LAZY_MODULES = ("groq", "matplotlib", "reportlab")
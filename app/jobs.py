@@ -0,0 +1,128 @@
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import JOB_WORKERS, JOB_QUEUE_LIMIT, JOB_HISTORY_LIMIT
+
+
+class QueueFull(Exception):
+    pass
+
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="sonalyze-job")
+_jobs = {}
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)  # notified on every new job event
+
+
+def _public(job):
+    return {k: v for k, v in job.items() if not k.startswith("_")}
+
+
+def _prune_history():
+    finished = [j for j in _jobs.values() if j["status"] in ("done", "failed")]
+    finished.sort(key=lambda j: j["finished_at"])
+    for job in finished[:max(0, len(finished) - JOB_HISTORY_LIMIT)]:
+        del _jobs[job["id"]]
+
+
+def _emit(job, event, data):
+    # Caller holds _lock
+    job["_events"].append((event, data))
+    _changed.notify_all()
+
+
+def _set_status(job, status, **fields):
+    with _lock:
+        job.update(fields, status=status)
+        _emit(job, "status", {"status": status, "error": job["error"], "result": job["result"]})
+
+
+def _run(job, target, kwargs):
+    def on_event(event, data):
+        with _lock:
+            _emit(job, event, data)
+
+    _set_status(job, "running", started_at=time.time())
+    try:
+        result = target(on_event=on_event, **kwargs)
+        # "_"-prefixed entries (e.g. the PDF bytes) stay server-side; stored
+        # under the lock together with the status
+        artifacts = {}
+        if isinstance(result, dict):
+            artifacts = {k: result.pop(k) for k in list(result) if k.startswith("_")}
+        _set_status(job, "done", result=result, finished_at=time.time(), _artifacts=artifacts)
+    except Exception as e:
+        traceback.print_exc()
+        _set_status(job, "failed", error=str(e), finished_at=time.time())
+    finally:
+        with _lock:
+            _prune_history()
+
+
+def submit_job(target, **kwargs):
+    """
+    Queue ``target(on_event=..., **kwargs)`` on the worker pool and return
+    the job snapshot. ``on_event(event, data)`` records progress events
+    that clients can follow with iter_events.
+    """
+    with _lock:
+        pending = sum(1 for j in _jobs.values() if j["status"] == "queued")
+        if pending >= JOB_QUEUE_LIMIT:
+            raise QueueFull(f"{pending} jobs already waiting, try again later")
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+            "_events": [],
+            "_artifacts": {},
+        }
+        _jobs[job["id"]] = job
+        _emit(job, "status", {"status": "queued", "error": None, "result": None})
+        snapshot = _public(job)
+
+    _executor.submit(_run, job, target, kwargs)
+    return snapshot
+
+
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        return _public(job) if job else None
+
+
+def get_artifact(job_id, name):
+    with _lock:
+        job = _jobs.get(job_id)
+        return job["_artifacts"].get(name) if job else None
+
+
+def iter_events(job_id, start=0, keepalive=15):
+    """
+    Yield (index, event, data) for the job's events from `start` on, waiting
+    for new ones until the job finishes. Yields None every `keepalive`
+    seconds without news so the caller can keep its connection open.
+    """
+    index = start
+    while True:
+        with _lock:
+            job = _jobs.get(job_id)
+            if job is None:
+                return
+            if index >= len(job["_events"]):
+                if job["status"] in ("done", "failed"):
+                    return
+                _changed.wait(keepalive)
+            events = job["_events"][index:]
+        if not events:
+            yield None
+        for event, data in events:
+            yield index, event, data
+            index += 1
@@ -0,0 +1,58 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from app.config import ROOM_TEMPLATES_CHECK_SECONDS
+
+TEMPLATE_SIZE = 120  # px, width and height of a new room in the planner
+
+_cache = {"signature": None, "checked": 0.0, "payload": None}
+_lock = threading.Lock()
+
+
+def _signature(folder):
+    # Names + mtimes + sizes: only stat calls, no file reads
+    try:
+        entries = [e for e in os.scandir(folder) if e.name.endswith(".html") and e.is_file()]
+    except FileNotFoundError:
+        return ()
+    return tuple(sorted((e.name, e.stat().st_mtime_ns, e.stat().st_size) for e in entries))
+
+
+def _build(folder, signature):
+    templates = []
+    for name, _, _ in signature:
+        with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+            svg_content = f.read()
+        templates.append({
+            "type": os.path.splitext(name)[0],
+            "svg": svg_content,
+            "width": TEMPLATE_SIZE,
+            "height": TEMPLATE_SIZE
+        })
+    body = json.dumps({"rooms": templates}, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return {
+        "body": body,
+        "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+        "etag": hashlib.sha256(body).hexdigest()[:32],
+    }
+
+
+def room_templates(folder):
+    """
+    The /rooms payload as {"body", "gzip", "etag"}, rebuilt only when a
+    template file was added, changed or removed.
+    """
+    now = time.monotonic()
+    with _lock:
+        if _cache["payload"] is not None and now - _cache["checked"] < ROOM_TEMPLATES_CHECK_SECONDS:
+            return _cache["payload"]
+        signature = _signature(folder)
+        if signature != _cache["signature"] or _cache["payload"] is None:
+            _cache["payload"] = _build(folder, signature)
+            _cache["signature"] = signature
+        _cache["checked"] = now
+        return _cache["payload"]
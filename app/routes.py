@@ -1,37 +1,48 @@
-from flask import render_template ,request, jsonify
+from flask import render_template ,request, jsonify, send_file, Response, stream_with_context
 
 from app import app
+from app.jobs import submit_job, get_job, get_artifact, iter_events, QueueFull
+from app.room_templates import room_templates
+from app.utils import current_workspace
 from pathlib import Path
-import json, uuid
-from scripts.json_parser import process_and_sample_folder
-from scripts.llm_intermidiary import send_to_llm
-from scripts.json_to_pdf import json_to_pdf
-DATA_DIR=Path("data")
-ROOMS_DIR=Path("data/rooms")
+import io, json, uuid
+from scripts import metrics
+from scripts.file_utils import atomic_write
+from scripts.ingest import LOG_EXTENSION, ingest_stream
+from scripts.label_index import cooccurrence, episodes, label_counts, open_label_index, popcount, select
+from scripts.pipeline import run_pipeline
+from scripts.columnar_store import room_dir_for, room_exists, to_epoch
+from scripts.resample import format_timestamps
+from scripts.rollups import daily_windows, open_rollups, query_range
+from scripts.workspace import is_valid_name
 SVG_DIR = Path("static/rooms") 
 @app.get("/rooms")
 def get_room_templates():
-    templates = []
-    for svg_file in SVG_DIR.glob("*.html"):
-        type_name = svg_file.stem
-        svg_content = svg_file.read_text()
-        templates.append({
-            "type": type_name,
-            "svg": svg_content,
-            "width": 120,
-            "height": 120
-        })
-    return jsonify({"rooms": templates})
+    # Built once in memory; browsers revalidate with If-None-Match and get a 304
+    templates = room_templates(SVG_DIR)
+    gzipped = "gzip" in request.headers.get("Accept-Encoding", "")
+    response = Response(templates["gzip"] if gzipped else templates["body"], mimetype="application/json")
+    if gzipped:
+        response.headers["Content-Encoding"] = "gzip"
+    # The two encodings are different bytes, so they get different tags
+    response.set_etag(templates["etag"] + ("-gz" if gzipped else ""))
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 # --- Save layout ---
 @app.post("/layout/save")
 def save_layout():
+    try:
+        workspace = current_workspace()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     payload = request.get_json()
     wrapper = {
         "id": str(uuid.uuid4()),
         "layout": payload.get("layout", [])
     }
-    with open(DATA_DIR / "saved_layout.json", "w", encoding="utf-8") as f:
+    with atomic_write(workspace["layout"]) as f:
         json.dump(wrapper, f, indent=2)
     return jsonify({"status": "saved", "id": wrapper["id"]})
 
@@ -39,15 +50,25 @@ def save_layout():
 @app.post("/room/data")
 def upload_room_json():
     try:
+        workspace = current_workspace()
         room_id = request.form.get("room_id")
         file = request.files.get("file")
         if not room_id or not file:
             return jsonify({"error": "Missing room_id or file"}), 400
+        if not is_valid_name(room_id):
+            return jsonify({"error": "Invalid room_id"}), 400
 
-        out = ROOMS_DIR / f"{room_id}.json"
+        out = Path(workspace["rooms"]) / f"{room_id}.json"
+        # Both files would feed the same room outputs
+        if out.with_suffix(LOG_EXTENSION).exists():
+            return jsonify({"error": f"Room {room_id} already receives streamed records ({room_id}{LOG_EXTENSION})"}), 409
         print(room_id)
-        file.save(out)
+        # Atomic: a pipeline run never sees a half-uploaded file
+        with atomic_write(out, "wb") as f:
+            file.save(f)
         return jsonify({"status": "stored", "room_id": room_id})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(
             e
@@ -55,20 +76,190 @@ def upload_room_json():
         return jsonify({"error": str(e)}), 500
 
 
+# --- Stream measurements (newline-delimited JSON) into a room's log ---
+@app.post("/room/<room_id>/records")
+def ingest_room_records(room_id):
+    try:
+        workspace = current_workspace()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not is_valid_name(room_id):
+        return jsonify({"error": "Invalid room_id"}), 400
+
+    log_path = Path(workspace["rooms"]) / f"{room_id}{LOG_EXTENSION}"
+    if log_path.with_suffix(".json").exists():
+        return jsonify({"error": f"Room {room_id} already has an uploaded file ({room_id}.json)"}), 409
+    # Read straight from the socket: the body is never held in memory
+    result = ingest_stream(request.stream, log_path, box_id=request.args.get("box_id"))
+    status = 400 if result["rejected"] and not result["accepted"] else 200
+    return jsonify({"status": "stored" if status == 200 else "rejected", "room_id": room_id, **result}), status
+
+
+# --- Room queries on the columnar store (stats, labels) ---
+# ?from=2024-05-01 22:00&to=2024-05-08&hours=22:00-06:00 (all optional)
+TIME_FILTER_ERROR = "Expected from/to as YYYY-MM-DD[ HH:MM[:SS]] and hours as HH:MM-HH:MM"
+
+
+def _room_store(room_id):
+    """(columnar dir of the room, None), or (None, error response)."""
+    try:
+        workspace = current_workspace()
+    except ValueError as e:
+        return None, (jsonify({"error": str(e)}), 400)
+    if not is_valid_name(room_id):
+        return None, (jsonify({"error": "Invalid room_id"}), 400)
+    room_dir = room_dir_for(room_id, workspace["columnar"])
+    if not room_exists(room_dir):
+        return None, (jsonify({"error": "Unknown room (run the pipeline first)"}), 404)
+    return room_dir, None
+
+
+def _time_filter(timestamps):
+    """(start, stop, (day_from, day_to) or None) in epoch seconds; ValueError when malformed."""
+    start = to_epoch(request.args["from"]) if request.args.get("from") else int(timestamps[0]) if len(timestamps) else 0
+    stop = to_epoch(request.args["to"]) if request.args.get("to") else int(timestamps[-1]) + 1 if len(timestamps) else 0
+    daily = None
+    if request.args.get("hours"):
+        daily = tuple(to_epoch(f"1970-01-01 {h.strip()}") for h in request.args["hours"].split("-"))
+        if len(daily) != 2:
+            raise ValueError(request.args["hours"])
+    return start, stop, daily
+
+
+@app.get("/room/<room_id>/stats")
+def room_stats(room_id):
+    # Level stats from the precomputed rollups
+    room_dir, error = _room_store(room_id)
+    if error:
+        return error
+    try:
+        start, stop, daily = _time_filter(open_rollups(room_dir)["columns"]["timestamp"])
+    except ValueError:
+        return jsonify({"error": TIME_FILTER_ERROR}), 400
+    windows = daily_windows(start, stop, *daily) if daily else [(start, stop)]
+
+    stats, used = query_range(room_dir, windows)
+    start_text, stop_text = format_timestamps([start, stop]).tolist()
+    return jsonify({"room_id": room_id, "from": start_text, "to": stop_text, "fenetres": len(windows),
+                    "niveaux": stats, "lectures": used})
+
+
+@app.get("/room/<room_id>/labels")
+def room_labels(room_id):
+    # Records with all of ?all=A,B and one of ?any=C,D, from the label bitmaps;
+    # hours are matched by whole hour
+    room_dir, error = _room_store(room_id)
+    if error:
+        return error
+    index = open_label_index(room_dir)
+    try:
+        start, stop, daily = _time_filter(index["timestamp"])
+    except ValueError:
+        return jsonify({"error": TIME_FILTER_ERROR}), 400
+    hours = None
+    if daily:
+        span = (daily[1] - daily[0]) % 86400 or 86400
+        hours = [(daily[0] // 3600 + h) % 24 for h in range(-(-span // 3600))]
+    all_of = [l for l in request.args.get("all", "").split(",") if l]
+    any_of = [l for l in request.args.get("any", "").split(",") if l]
+
+    selection = select(index, all_of, any_of, start, stop, hours)
+    runs = episodes(index, selection)
+    limit = request.args.get("episodes", 50, type=int)
+    return jsonify({
+        "room_id": room_id,
+        "mesures": popcount(selection),
+        "labels": [{"label": label, "mesures": count} for label, count in label_counts(index, selection).items()],
+        "cooccurrence": cooccurrence(index, selection, all_of + any_of) if all_of or any_of else {},
+        "episodes_total": len(runs),
+        "episodes": [dict(zip(("debut", "fin"), format_timestamps(run).tolist())) for run in runs[:limit]],
+    })
+
+
 @app.route("/run-scripts", methods=["POST"])
 def run_scripts():
+    # The pipeline runs on the background worker pool; poll /jobs/<id>
+    # ?no_cache=1 forces fresh LLM answers for this run
+    use_cache = request.args.get("no_cache") != "1"
+    try:
+        workspace = current_workspace()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        job = submit_job(run_pipeline, workspace_root=workspace["root"], use_cache=use_cache)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify({"status": job["status"], "job_id": job["id"]}), 202
+
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+
+@app.get("/jobs/<job_id>/events")
+def job_events(job_id):
+    # Server-Sent Events: stage changes, finished rooms, consolidation tokens
+    if get_job(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+    last_id = request.headers.get("Last-Event-ID", "")
+    start = int(last_id) + 1 if last_id.isdigit() else 0
+
+    def stream():
+        for item in iter_events(job_id, start):
+            if item is None:
+                yield ": keepalive\n\n"
+                continue
+            index, event, data = item
+            yield f"id: {index}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/jobs/<job_id>/pdf")
+def job_pdf(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Job is {job['status']}"}), 409
+    download_name = f"sonalyze_{job_id}.pdf"
+    pdf_bytes = get_artifact(job_id, "_pdf")
+    if pdf_bytes is not None:
+        return send_file(io.BytesIO(pdf_bytes), mimetype="application/pdf", download_name=download_name)
+    pdf_path = Path(job["result"]["pdf_path"])
+    if not pdf_path.exists():
+        return jsonify({"error": "Report not found"}), 404
+    return send_file(pdf_path.resolve(), mimetype="application/pdf",
+                     download_name=download_name)
+
+
+# --- Render a report from an analysis JSON, without touching disk ---
+@app.post("/report/pdf")
+def report_pdf():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected the analysis JSON as body"}), 400
+    from scripts.json_to_pdf import render_pdf_bytes
+    return send_file(io.BytesIO(render_pdf_bytes(data)), mimetype="application/pdf",
+                     download_name="sonalyze_report.pdf")
+
 
-    # Run in order — EACH one waits for the previous one to finish
-    process_and_sample_folder()
-    send_to_llm(export_path="exports/prompt_result/llm_resilt.json")
-    json_to_pdf(file_path="exports/prompt_result/llm_resilt.json",export_path="exports/final_result/output.pdf")
-    
+# --- Prometheus scrape endpoint ---
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
-    
 
-    return jsonify({"status": "all done"})
+@app.get("/")
+def landing():
+    return render_template("landing.html")
 
 
-@app.route("/")
+@app.get("/index")
 def index():
     return render_template("index.html")
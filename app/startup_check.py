@@ -0,0 +1,46 @@
+import json
+import subprocess
+import sys
+
+from app.config import STARTUP_BUDGET_SECONDS, LAZY_MODULES
+
+# Imports the app in a fresh interpreter, the way a worker starts, and fails
+# when it takes longer than the budget or pulls in a stage module eagerly.
+#
+#   python -m app.startup_check [budget_seconds]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+lazy = {lazy!r}
+print(json.dumps({{"seconds": elapsed, "eager": sorted(m for m in lazy if m in sys.modules)}}))
+"""
+
+
+def measure_startup():
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(lazy=list(LAZY_MODULES))],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    budget = float(argv[0]) if argv else STARTUP_BUDGET_SECONDS
+    result = measure_startup()
+    print(f"import app: {result['seconds']:.3f}s (budget {budget:.3f}s)")
+    failed = False
+    if result["seconds"] > budget:
+        print("FAIL: startup is over budget")
+        failed = True
+    if result["eager"]:
+        print(f"FAIL: imported at startup, should be lazy: {', '.join(result['eager'])}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
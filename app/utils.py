@@ -0,0 +1,17 @@
+from flask import request
+
+from scripts.workspace import workspace_root, ensure_workspace
+
+
+def current_workspace():
+    """
+    Workspace paths of the current request: X-Workspace header, or a
+    `workspace` query/form field; "default" (the repo root) when absent.
+    Raises ValueError on an invalid id.
+    """
+    workspace_id = (
+        request.headers.get("X-Workspace")
+        or request.args.get("workspace")
+        or request.form.get("workspace")
+    )
+    return ensure_workspace(workspace_root(workspace_id))
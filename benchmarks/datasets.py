@@ -0,0 +1,71 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+# Synthetic box exports, same shape as test_data_n*.json. Seeded, so a
+# case always produces the same bytes and timings stay comparable.
+START_TIME = datetime(2025, 12, 5, 0, 0, 0)
+SEED = 1234
+LABEL_POOL = [
+    "Vehicle", "Engine", "Car", "Wind", "Rain",
+    "Human speech", "Silence", "Footsteps",
+    "Bird", "Fan", "AC", "Construction", "Traffic"
+]
+RATING_EDGES = [30, 40, 50, 60, 70]  # same bands as scripts/json_example_creator.py
+
+
+def case_name(rooms, days, rate):
+    return f"{rooms}r×{days}d×{rate}s"
+
+
+def record_count(days, rate):
+    return days * 86400 // rate
+
+
+def generate_room(days, rate, seed=SEED):
+    """List of raw records for one room: one every `rate` seconds for `days` days."""
+    rng = np.random.default_rng(seed)
+    n = record_count(days, rate)
+    start = int(START_TIME.timestamp())
+    timestamps = start + np.arange(n, dtype=np.int64) * rate
+    # Quiet nights, busier days, plus noise
+    hours = (timestamps - start) % 86400 / 3600
+    laeq = np.round(40 + 15 * np.sin((hours - 8) / 24 * 2 * np.pi) + rng.normal(0, 8, n), 2)
+    ratings = np.array(list("ABCDEF"))[np.searchsorted(RATING_EDGES, laeq)]
+    labels = np.argsort(rng.random((n, len(LABEL_POOL))), axis=1)[:, :5]
+
+    return [
+        {
+            "box_id": "bench",
+            "timestamp": datetime.fromtimestamp(int(ts)).strftime("%Y-%m-%d %H:%M:%S"),
+            "LAeq_segment_dB": float(db),
+            "LAeq_rating": str(rating),
+            "top_5_labels": [LABEL_POOL[i] for i in row],
+        }
+        for ts, db, rating, row in zip(timestamps, laeq, ratings, labels)
+    ]
+
+
+def write_rooms(folder, rooms, days, rate):
+    """Writes `rooms` room files into `folder`; returns (records, bytes) written."""
+    os.makedirs(folder, exist_ok=True)
+    records = 0
+    for i in range(rooms):
+        data = generate_room(days, rate, seed=SEED + i)
+        path = os.path.join(folder, f"room{i + 1}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        records += len(data)
+    size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+    return records, size
+
+
+def layout_for(rooms):
+    """A saved-layout list placing the rooms on a grid, for the floorplan."""
+    return [
+        {"x": (i % 4) * 220, "y": (i // 4) * 180, "width": 200, "height": 160,
+         "attached_json": f"room{i + 1}.json"}
+        for i in range(rooms)
+    ]
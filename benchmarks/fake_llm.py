@@ -0,0 +1,59 @@
+import json
+import time
+from types import SimpleNamespace
+
+# Stand-in for scripts.llm_contact.ask_llm: same chunk shape as a Groq
+# stream, no network, optional fixed latency. Lets the benchmark measure
+# what send_to_llm itself costs around the model.
+
+FINAL_RESULT = {
+    "interpretation": {
+        "note_globale": "C",
+        "explication_note": "Niveaux modérés le jour, quelques pics la nuit.",
+        "comparaison_seuils": "Au-dessus des 30 dB recommandés la nuit."
+    },
+    "analyse_bruits": {
+        "classification": {
+            "bons": ["Bird", "Wind", "Rain"],
+            "derangeants": ["Traffic", "Construction", "Car", "Engine"]
+        },
+        "categories": {"exterieur": "Trafic", "interieur_voisinage": "Voix", "equipements": "Ventilation"},
+        "recurrence": "Pics quotidiens vers 8h et 18h.",
+        "jour_nuit": "Jour plus bruyant que la nuit."
+    },
+    "hypotheses": {"faiblesses_structurelles": ["Fenêtres simple vitrage", "Bouches d'aération"]},
+    "recommandations": [
+        {"niveau": "Low-cost", "action": "Joints de fenêtre", "cout_estime": "10 - 50 €"},
+        {"niveau": "Intermédiaire", "action": "Rideaux acoustiques", "cout_estime": "100 - 300 €"},
+        {"niveau": "Travaux", "action": "Double vitrage", "cout_estime": "800 - 2000 €"}
+    ]
+}
+CHUNK_CHARS = 16
+
+
+class FakeLLM:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, chat_history, use_cache=True):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        user = chat_history[-1]["content"]
+        if "Compile" in user:
+            text = json.dumps(FINAL_RESULT, ensure_ascii=False)
+        else:
+            text = "Résumé de la pièce : " + user[:200]
+        return iter([
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + CHUNK_CHARS]))])
+            for i in range(0, len(text), CHUNK_CHARS)
+        ])
+
+
+def install(latency=0.0):
+    """Replaces the LLM call used by send_to_llm; returns the fake."""
+    import scripts.llm_intermidiary as llm_intermidiary
+    fake = FakeLLM(latency)
+    llm_intermidiary.ask_llm = fake
+    return fake
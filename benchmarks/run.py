@@ -0,0 +1,233 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import fake_llm
+from benchmarks.datasets import case_name, generate_room, layout_for, write_rooms
+
+# Times every pipeline stage on synthetic apartments of growing size and
+# compares the medians with a stored baseline. Run from the repo root:
+#
+#   python -m benchmarks.run                      # default cases, compare with baseline
+#   python -m benchmarks.run --preset large
+#   python -m benchmarks.run --case 8:7:1 --repeat 5
+#   python -m benchmarks.run --save-baseline      # after an intended change
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+TOLERANCE = 0.25  # slower / bigger than the baseline by more than this = regression
+# Differences below these are noise, whatever the ratio
+MIN_DELTA = {"median_s": 0.005, "peak_mb": 1.0}
+
+# (rooms, days, seconds between records)
+PRESETS = {
+    "small": [(1, 1, 120), (2, 1, 30), (4, 1, 10)],
+    "medium": [(1, 1, 120), (2, 1, 30), (4, 1, 10), (4, 1, 1), (4, 7, 10)],
+    "large": [(4, 1, 1), (4, 7, 10), (8, 7, 1)],
+}
+
+
+# -------------------------
+# Measuring
+# -------------------------
+
+def measure(fn, setup=None, repeat=3):
+    """Median/min wall time over `repeat` runs, then one traced run for peak memory."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"median_s": statistics.median(times), "min_s": min(times), "peak_mb": peak / 2**20}
+
+
+# -------------------------
+# Stages
+# -------------------------
+
+def bench_case(rooms, days, rate, workdir, repeat, llm_latency):
+    from scripts.json_parser import process_and_sample_folder, sample_every_2_minutes
+    from scripts.llm_intermidiary import send_to_llm
+    from scripts import json_to_pdf
+    from scripts.floor_plan_gen import layout_rooms, render_floorplan
+
+    name = case_name(rooms, days, rate)
+    rooms_dir = os.path.join(workdir, "rooms")
+    parsed_dir = os.path.join(workdir, "parsed_json")
+    columnar_dir = os.path.join(workdir, "columnar")
+    manifest = os.path.join(workdir, "manifest.json")
+    records, size = write_rooms(rooms_dir, rooms, days, rate)
+    results = {}
+
+    # 1. Sampling one room, records already in memory
+    data = generate_room(days, rate)
+    results["sample"] = measure(lambda: list(sample_every_2_minutes(data)), repeat=repeat)
+    results["sample"]["records_per_s"] = len(data) / results["sample"]["median_s"]
+    results["sample"]["records"] = len(data)
+    del data
+
+    # 2. Full parse of the folder, from scratch then with nothing changed
+    def clean_outputs():
+        for path in (parsed_dir, columnar_dir):
+            shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(manifest):
+            os.remove(manifest)
+
+    def parse():
+        process_and_sample_folder(rooms_dir, parsed_dir, columnar_dir, manifest)
+
+    results["parse"] = measure(parse, setup=clean_outputs, repeat=repeat)
+    results["parse"]["records_per_s"] = records / results["parse"]["median_s"]
+    results["parse"]["mb_per_s"] = size / 2**20 / results["parse"]["median_s"]
+    results["parse_unchanged"] = measure(parse, repeat=repeat)
+
+    # 3. LLM orchestration around a fake model
+    fake_llm.install(llm_latency)
+    llm_result = os.path.join(workdir, "llm_result.json")
+    results["llm"] = measure(
+        lambda: send_to_llm(llm_result, use_cache=False, parsed_folder=parsed_dir,
+                            columnar_folder=columnar_dir),
+        repeat=repeat,
+    )
+    results["llm"]["rooms_per_s"] = rooms / results["llm"]["median_s"]
+
+    # 4. Floorplan + PDF, chart cache emptied so every run renders
+    analysis = fake_llm.FINAL_RESULT
+    noise = {f"room{i + 1}": 40 + 3 * i for i in range(rooms)}
+    plan = layout_rooms(layout_for(rooms))
+
+    def pdf():
+        png = render_floorplan(plan, noise)
+        json_to_pdf.create_pdf_with_graphs(analysis, io.BytesIO(), png)
+
+    results["pdf"] = measure(pdf, setup=json_to_pdf._chart_cache.clear, repeat=repeat)
+
+    for stage in results.values():
+        stage.setdefault("records", records)
+        stage.update(case=name, input_mb=size / 2**20)
+    return {f"{stage}@{name}": r for stage, r in results.items()}
+
+
+def run(cases, repeat=3, llm_latency=0.0):
+    results = {}
+    for rooms, days, rate in cases:
+        workdir = tempfile.mkdtemp(prefix="bench-")
+        try:
+            # The stages print their progress; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.update(bench_case(rooms, days, rate, workdir, repeat, llm_latency))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        print(f"  {case_name(rooms, days, rate)} done", file=sys.stderr)
+    return results
+
+
+# -------------------------
+# Baseline
+# -------------------------
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Rows of (key, metric, baseline, current, ratio) for every metric past the tolerance."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if previous is None:
+            continue
+        for metric in ("median_s", "peak_mb"):
+            if previous[metric] <= 0:
+                continue
+            ratio = current[metric] / previous[metric]
+            if ratio > 1 + tolerance and current[metric] - previous[metric] > MIN_DELTA[metric]:
+                regressions.append((key, metric, previous[metric], current[metric], ratio))
+    return regressions
+
+
+def print_report(results, baseline):
+    previous = baseline.get("results", {}) if baseline else {}
+    print(f"{'stage@case':<28} {'records':>9} {'median s':>9} {'peak MB':>8} {'throughput':>16} {'vs base':>8}")
+    for key in sorted(results, key=lambda k: (k.split("@")[0], results[k]["records"])):
+        r = results[key]
+        if "records_per_s" in r:
+            throughput = f"{r['records_per_s']:,.0f} rec/s"
+        elif "rooms_per_s" in r:
+            throughput = f"{r['rooms_per_s']:,.1f} rooms/s"
+        else:
+            throughput = ""
+        ratio = ""
+        if key in previous and previous[key]["median_s"] > 0:
+            ratio = f"{r['median_s'] / previous[key]['median_s']:.2f}x"
+        print(f"{key:<28} {r['records']:>9} {r['median_s']:>9.4f} {r['peak_mb']:>8.1f} {throughput:>16} {ratio:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--case", action="append", default=[], metavar="ROOMS:DAYS:RATE",
+                        help="extra case, e.g. 8:7:1 (repeatable); replaces the preset")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per fake LLM call")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--output", help="also write the results as JSON here")
+    args = parser.parse_args(argv)
+
+    cases = [tuple(int(v) for v in c.split(":")) for c in args.case] or PRESETS[args.preset]
+    results = run(cases, args.repeat, args.llm_latency)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for key, metric, before, after, ratio in regressions:
+        print(f"REGRESSION {key} {metric}: {before:.4f} -> {after:.4f} ({ratio:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
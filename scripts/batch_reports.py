@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+from scripts.config_api import LLM_CONCURRENCY
+from scripts.file_utils import atomic_write
+from scripts.workspace import workspace_paths
+
+# Nightly batch: one report per apartment, apartments spread over a
+# process pool. Each apartment directory is a workspace (data/rooms/*.json,
+# optional data/saved_layout.json), so its outputs land in its own exports/.
+#
+#   python -m scripts.batch_reports apartments/ --workers 8 --llm-concurrency 6
+
+SUMMARY_FILE = "batch_summary.json"
+
+
+# -------------------------
+# Worker side
+# -------------------------
+
+def _init_worker(limiter, workers):
+    from scripts.llm_contact import set_llm_limiter
+    from scripts.llm_gateway import share_budgets
+    set_llm_limiter(limiter)
+    # The RPM/TPM buckets live in each process: split the key's budgets between them
+    share_budgets(workers)
+
+
+def _run_apartment(apartment_dir, use_cache):
+    stages = {}
+    current = {"stage": None, "start": None}
+
+    def on_event(event, data):
+        if event != "stage":
+            return
+        now = time.perf_counter()
+        if current["stage"] is not None:
+            stages[current["stage"]] = round(now - current["start"], 3)
+        current["stage"], current["start"] = data["stage"], now
+
+    result = {"apartment": os.path.basename(apartment_dir), "path": apartment_dir}
+    start = time.perf_counter()
+    try:
+        from scripts.pipeline import run_pipeline
+        outputs = run_pipeline(workspace_root=apartment_dir, use_cache=use_cache, on_event=on_event)
+        result.update(status="done", run_id=outputs["run_id"],
+                      rooms=outputs["processed_files"], pdf_path=outputs["pdf_path"])
+    except Exception as e:
+        result.update(status="failed", error=f"{type(e).__name__}: {e}",
+                      traceback=traceback.format_exc())
+    end = time.perf_counter()
+    if current["stage"] is not None:
+        stages[current["stage"]] = round(end - current["start"], 3)
+    result["stages"] = stages
+    result["seconds"] = round(end - start, 3)
+    return result
+
+
+# -------------------------
+# Batch driver
+# -------------------------
+
+def find_apartments(apartments_dir):
+    apartments = []
+    for name in sorted(os.listdir(apartments_dir)):
+        path = os.path.join(apartments_dir, name)
+        if os.path.isdir(workspace_paths(path)["rooms"]):
+            apartments.append(path)
+    return apartments
+
+
+def run_batch(apartments_dir, workers=None, llm_concurrency=LLM_CONCURRENCY,
+              use_cache=True, summary_path=None):
+    apartments = find_apartments(apartments_dir)
+    if not apartments:
+        raise FileNotFoundError(f"No apartment with a data/rooms folder in {apartments_dir}")
+    workers = min(workers or os.cpu_count() or 1, len(apartments))
+    summary_path = summary_path or os.path.join(apartments_dir, SUMMARY_FILE)
+
+    results = []
+    start = time.perf_counter()
+    with Manager() as manager:
+        # One semaphore for every process, so the provider sees at most
+        # llm_concurrency streams whatever the pool size
+        limiter = manager.BoundedSemaphore(llm_concurrency)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(limiter, workers)) as pool:
+            futures = [pool.submit(_run_apartment, path, use_cache) for path in apartments]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                status = "ok" if result["status"] == "done" else f"FAILED ({result['error']})"
+                print(f"{result['apartment']}: {result['seconds']:.1f}s {status}")
+
+    results.sort(key=lambda r: r["apartment"])
+    failed = [r["apartment"] for r in results if r["status"] != "done"]
+    summary = {
+        "apartments_dir": apartments_dir,
+        "workers": workers,
+        "llm_concurrency": llm_concurrency,
+        "total_seconds": round(time.perf_counter() - start, 3),
+        "done": len(results) - len(failed),
+        "failed": failed,
+        "apartments": results,
+    }
+    with atomic_write(summary_path) as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the reports of many apartments in parallel.")
+    parser.add_argument("apartments_dir", help="folder with one workspace folder per apartment")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY,
+                        help="LLM streams open at once across ALL workers")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the LLM response cache")
+    parser.add_argument("--summary", default=None, help=f"summary path (default: <apartments_dir>/{SUMMARY_FILE})")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(args.apartments_dir, args.workers, args.llm_concurrency,
+                        use_cache=not args.no_cache, summary_path=args.summary)
+    print(f"{summary['done']} done, {len(summary['failed'])} failed in {summary['total_seconds']:.1f}s")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
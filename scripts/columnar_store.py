@@ -0,0 +1,183 @@
+import json
+import os
+import tempfile
+import threading
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+
+from scripts.file_utils import SharedLock, replace_dir
+from scripts.rollups import save_rollups
+
+COLUMNAR_FOLDER = "exports/columnar"
+FORMAT_VERSION = 2
+
+RATINGS = "ABCDEFG"
+NO_RATING = 255
+NO_LABEL = -1
+LABEL_SLOTS = 5
+
+# column name -> dtype on disk
+COLUMNS = {
+    "timestamp": np.int64,   # epoch seconds (box local time, stored as if UTC)
+    "laeq": np.float32,      # energetic mean of the bucket
+    "laeq_max": np.float32,
+    "rating": np.uint8,      # index into RATINGS, NO_RATING if missing
+    "labels": np.int16,      # (n, LABEL_SLOTS) index into the label vocabulary
+    "box": np.uint16,        # index into the box_id vocabulary
+}
+
+
+def to_epoch(ts):
+    return int(datetime.fromisoformat(ts).replace(tzinfo=timezone.utc).timestamp())
+
+
+class ColumnBuilder:
+    """Accumulates sampled records into compact typed buffers."""
+
+    def __init__(self):
+        self.timestamp = array("q")
+        self.laeq = array("f")
+        self.laeq_max = array("f")
+        self.rating = array("B")
+        self.labels = array("h")
+        self.box = array("H")
+        self.label_vocab = {}
+        self.box_vocab = {}
+
+    @classmethod
+    def load(cls, room_dir, records=None):
+        """Builder pre-filled with the first `records` records of an existing store."""
+        builder = cls()
+        columns = open_room_columns(room_dir)
+        n = columns["records"] if records is None else records
+        for name in COLUMNS:
+            getattr(builder, name).frombytes(np.ascontiguousarray(columns[name][:n]).tobytes())
+        builder.label_vocab = {label: i for i, label in enumerate(columns["labels_vocab"])}
+        builder.box_vocab = {box: i for i, box in enumerate(columns["box_ids"])}
+        return builder
+
+    def _intern(self, vocab, value):
+        code = vocab.get(value)
+        if code is None:
+            code = vocab[value] = len(vocab)
+        return code
+
+    def append(self, record):
+        self.timestamp.append(to_epoch(record["timestamp"]))
+        laeq = record.get("LAeq_segment_dB")
+        self.laeq.append(float("nan") if laeq is None else laeq)
+        laeq_max = record.get("LAeq_max_dB", laeq)
+        self.laeq_max.append(float("nan") if laeq_max is None else laeq_max)
+        rating = record.get("LAeq_rating")
+        self.rating.append(RATINGS.index(rating) if rating and rating in RATINGS else NO_RATING)
+        labels = list(record.get("top_5_labels") or [])[:LABEL_SLOTS]
+        for label in labels:
+            self.labels.append(self._intern(self.label_vocab, label))
+        for _ in range(LABEL_SLOTS - len(labels)):
+            self.labels.append(NO_LABEL)
+        self.box.append(self._intern(self.box_vocab, record.get("box_id") or ""))
+
+    def collect(self, records):
+        """Pass records through unchanged while appending them."""
+        for record in records:
+            self.append(record)
+            yield record
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def save(self, room_dir):
+        # Built in a sibling temp dir and swapped in whole: a reader that has
+        # the old columns mapped keeps a consistent view
+        parent = os.path.dirname(room_dir) or "."
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+        n = len(self)
+        buffers = {
+            "timestamp": self.timestamp,
+            "laeq": self.laeq,
+            "laeq_max": self.laeq_max,
+            "rating": self.rating,
+            "labels": self.labels,
+            "box": self.box,
+        }
+        for name, buf in buffers.items():
+            column = np.frombuffer(buf, dtype=COLUMNS[name]) if n else np.empty(0, COLUMNS[name])
+            if name == "labels":
+                column = column.reshape(n, LABEL_SLOTS)
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), column)
+        save_rollups(tmp_dir, *(np.frombuffer(buffers[name], dtype=COLUMNS[name]) if n else np.empty(0)
+                                for name in ("timestamp", "laeq", "laeq_max")))
+        from scripts.label_index import save_label_bitmaps  # label_index -> room_stats -> this module
+        save_label_bitmaps(tmp_dir, np.frombuffer(self.timestamp, dtype=np.int64) if n else np.empty(0, np.int64),
+                           np.frombuffer(self.labels, dtype=np.int16).reshape(n, LABEL_SLOTS) if n
+                           else np.empty((0, LABEL_SLOTS), np.int16),
+                           len(self.label_vocab))
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "records": n,
+            "labels": sorted(self.label_vocab, key=self.label_vocab.get),
+            "box_ids": sorted(self.box_vocab, key=self.box_vocab.get),
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        with store_lock(room_dir).exclusive():
+            replace_dir(tmp_dir, room_dir)
+
+
+def room_dir_for(room_name, columnar_folder=COLUMNAR_FOLDER):
+    return os.path.join(columnar_folder, room_name)
+
+
+# replace_dir leaves a short moment where the room dir is missing. Readers
+# hold the lock of the columnar folder shared while they open a room (once
+# the files are memory-mapped, a swap no longer affects them) and the swap
+# holds it exclusive.
+_store_locks = {}
+_store_locks_guard = threading.Lock()
+
+
+def store_lock(room_dir):
+    key = os.path.abspath(os.path.dirname(room_dir))
+    with _store_locks_guard:
+        if key not in _store_locks:
+            _store_locks[key] = SharedLock()
+        return _store_locks[key]
+
+
+def room_exists(room_dir):
+    with store_lock(room_dir).shared():
+        return os.path.exists(os.path.join(room_dir, "meta.json"))
+
+
+def open_room_columns(room_dir):
+    """
+    Open a room store memory-mapped (read-only, zero copy). Returns a dict
+    with the COLUMNS arrays plus the `labels_vocab` / `box_ids` lists.
+    """
+    with store_lock(room_dir).shared():
+        with open(os.path.join(room_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        columns = {name: np.load(os.path.join(room_dir, f"{name}.npy"), mmap_mode="r") for name in COLUMNS}
+
+    for name, column in columns.items():
+        columns[name] = column[:meta["records"]]
+    columns["labels_vocab"] = meta["labels"]
+    columns["box_ids"] = meta["box_ids"]
+    columns["records"] = meta["records"]
+    return columns
+
+
+def decode_labels(columns, codes=None):
+    """Label codes -> object array of label strings ('' for empty slots)."""
+    vocab = np.array(list(columns["labels_vocab"]) + [""], dtype=object)
+    codes = columns["labels"] if codes is None else codes
+    return vocab[np.where(codes == NO_LABEL, len(vocab) - 1, codes)]
+
+
+def decode_ratings(columns):
+    table = np.array(list(RATINGS) + [""] * (256 - len(RATINGS)), dtype=object)
+    return table[columns["rating"]]
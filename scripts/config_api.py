@@ -1 +1,45 @@
-MODEL = "openai/gpt-oss-120b"
\ No newline at end of file
+import os
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODEL = "openai/gpt-oss-120b"
+
+# Point the Groq client at another OpenAI/Groq-compatible server
+# (e.g. a local stand-in for offline runs). None = the real Groq API.
+LLM_BASE_URL = os.environ.get("GROQ_BASE_URL") or None
+LLM_LOCAL = bool(LLM_BASE_URL) and urlparse(LLM_BASE_URL).hostname in ("127.0.0.1", "localhost", "::1")
+
+# Maximum number of per-room analyses streamed at the same time.
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "4"))
+
+# On-disk cache of LLM responses, keyed by model + prompt.
+LLM_CACHE_DIR = os.environ.get("LLM_CACHE_DIR", "exports/llm_cache")
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+LLM_CACHE_MAX_AGE = int(os.environ.get("LLM_CACHE_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+LLM_CACHE_BYPASS = os.environ.get("LLM_CACHE_BYPASS", "0") == "1"
+
+# Provider limits, shared by every LLM call of the process (scripts/llm_gateway.py).
+# Defaults are Groq's free-tier limits for MODEL; raise them to your account's. 0 = no limit,
+# the default for a local server (the stand-in has no limits and reports no token usage).
+LLM_RPM = int(os.environ.get("LLM_RPM", "0" if LLM_LOCAL else "30"))
+LLM_TPM = int(os.environ.get("LLM_TPM", "0" if LLM_LOCAL else "8000"))
+LLM_EXPECTED_COMPLETION_TOKENS = 800  # reserved per call, corrected with the real usage afterwards
+LLM_CHARS_PER_TOKEN = 4               # rough prompt size estimate before sending
+
+# Retries on 429 / 5xx / connection errors, before the first token only
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = 0.5   # seconds, doubled on every attempt
+LLM_BACKOFF_MAX = 30.0
+LLM_TIMEOUT = 120.0      # seconds per request
+
+# Analysis of long recordings (scripts/llm_intermidiary.py):
+#   "direct"     one summary of the whole recording per room
+#   "map_reduce" one call per day/night period, then merged within the prompt budget
+#   "auto"       map_reduce for rooms recorded over more than LLM_MAP_REDUCE_MIN_HOURS
+# The summary of "direct" has the same size whatever the recording length, while
+# map_reduce costs ~2 calls per recorded day: opt in when the per-period detail is needed.
+LLM_ANALYSIS_MODE = os.environ.get("LLM_ANALYSIS_MODE", "direct")
+LLM_MAP_REDUCE_MIN_HOURS = 36
+LLM_PROMPT_BUDGET_CHARS = int(os.environ.get("LLM_PROMPT_BUDGET_CHARS", "24000"))  # user message, ~6k tokens
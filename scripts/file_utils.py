@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode="w", encoding="utf-8"):
+    """
+    Write to a temp file next to `path` and rename it into place on success,
+    so readers only ever see the old or the complete new file.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with open(fd, mode, encoding=None if "b" in mode else encoding) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def atomic_copy(src, dst):
+    with open(src, "rb") as fsrc, atomic_write(dst, "wb") as fdst:
+        shutil.copyfileobj(fsrc, fdst)
+
+
+def replace_dir(tmp_dir, target_dir):
+    """Swap a fully written directory into place (readers never see a half-written one)."""
+    old_dir = None
+    if os.path.exists(target_dir):
+        old_dir = tempfile.mkdtemp(dir=os.path.dirname(target_dir) or ".", prefix=".old-")
+        os.rmdir(old_dir)
+        os.rename(target_dir, old_dir)
+    os.rename(tmp_dir, target_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class SharedLock:
+    """
+    Many readers or one writer. Readers don't wait for each other (a reader
+    may nest shared sections); the writer waits until no reader is left.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            while self._writing:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
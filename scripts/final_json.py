@@ -0,0 +1,248 @@
+import json
+
+# Checks the final JSON of the consolidation while it streams in. The
+# schema is the example of scripts/context.txt: every key of an object
+# is required, a value must have the same type as in the example, and a
+# list's items follow its first element. Keys the example doesn't have
+# are accepted.
+
+SCHEMA_MARKER = "--- FORMAT DU JSON FINAL ATTENDU ---"
+PROSE_LIMIT = 2000  # characters of text accepted before the opening brace
+ENUMS = {("interpretation", "note_globale"): tuple("ABCDEFG")}  # one value of the tuple, not a substring
+REPAIR_SYSTEM_PROMPT = "Tu corriges des réponses JSON. Réponds uniquement avec le JSON demandé, sans texte autour."
+
+_WHITESPACE = " \t\r\n"
+_LITERAL_CHARS = set("0123456789+-.eEtrufalsn")
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def schema_from_context(text):
+    """The final JSON example of the system prompt, parsed."""
+    start = text.index("{", text.index(SCHEMA_MARKER))
+    schema, _ = json.JSONDecoder().raw_decode(text, start)
+    return schema
+
+
+def load_schema(context_path="scripts/context.txt"):
+    with open(context_path, "r", encoding="utf-8") as f:
+        return schema_from_context(f.read())
+
+
+def _type_name(spec):
+    return {dict: "object", list: "array", str: "string"}.get(type(spec), "number")
+
+
+def _path(path):
+    return ".".join(str(p) for p in path) or "racine"
+
+
+class StreamingValidator:
+    """
+    feed() the answer chunk by chunk; a SchemaError is raised as soon as
+    the text can no longer become a valid answer. close() returns the
+    parsed object. Prose or code fences around the object are ignored.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.text = []
+        self.length = 0
+        self.start = None      # offset of the opening brace
+        self.end = None        # offset just after the closing brace
+        self.stack = []        # open containers
+        self.in_string = False
+        self.escape = False
+        self.string_is_key = False
+        self.key = []
+        self.literal = []
+
+    @property
+    def done(self):
+        return self.end is not None
+
+    def feed(self, chunk):
+        offset = self.length
+        self.text.append(chunk)
+        self.length += len(chunk)
+        for i, c in enumerate(chunk):
+            if self.done:
+                return
+            self._char(c, offset + i)
+
+    def close(self):
+        if self.start is None:
+            raise SchemaError("Aucun objet JSON dans la réponse")
+        if not self.done:
+            raise SchemaError(f"Réponse tronquée dans {_path(self._current_path())}")
+        result = json.loads("".join(self.text)[self.start:self.end])
+        for path, allowed in ENUMS.items():
+            value = result
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is not None and value not in allowed:
+                raise SchemaError(f"{_path(path)} doit être l'une de {', '.join(allowed)}, pas {value!r}")
+        return result
+
+    # -------------------------
+    # Character level
+    # -------------------------
+
+    def _char(self, c, position):
+        if self.start is None:
+            if c == "{":
+                self.start = position
+                self._open(dict, self.schema, ())
+            elif position >= PROSE_LIMIT:
+                raise SchemaError("Pas d'objet JSON au début de la réponse")
+            return
+
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif c == "\\":
+                self.escape = True
+            elif c == '"':
+                self.in_string = False
+                if self.string_is_key:
+                    self._got_key("".join(self.key))
+                else:
+                    self._value_done()
+                return
+            elif c < " ":
+                raise SchemaError(f"Caractère de contrôle dans une chaîne ({_path(self._current_path())})")
+            if self.string_is_key:
+                self.key.append(c)
+            return
+
+        if self.literal:
+            if c in _LITERAL_CHARS:
+                self.literal.append(c)
+                return
+            self._end_literal()
+
+        if c in _WHITESPACE:
+            return
+
+        top = self.stack[-1]
+        state = top["state"]
+        if state == "colon":
+            if c != ":":
+                raise self._unexpected(c)
+            top["state"] = "value"
+        elif state in ("key", "key_or_end"):
+            if c == '"':
+                self.in_string, self.string_is_key, self.key = True, True, []
+            elif c == "}" and state == "key_or_end":
+                self._close(position)
+            else:
+                raise self._unexpected(c)
+        elif state == "comma_or_end":
+            if c == ",":
+                top["state"] = "key" if top["type"] is dict else "value"
+            elif c == ("}" if top["type"] is dict else "]"):
+                self._close(position)
+            else:
+                raise self._unexpected(c)
+        elif state in ("value", "value_or_end"):
+            if c == "]" and state == "value_or_end":
+                self._close(position)
+            else:
+                self._start_value(c, position)
+
+    def _unexpected(self, c):
+        return SchemaError(f"Caractère inattendu {c!r} dans {_path(self._current_path())}")
+
+    # -------------------------
+    # Structure
+    # -------------------------
+
+    def _current_path(self):
+        if not self.stack:
+            return ()
+        top = self.stack[-1]
+        if top["type"] is dict and top["key"] is not None and top["state"] in ("colon", "value"):
+            return top["path"] + (top["key"],)
+        return top["path"]
+
+    def _child(self):
+        # (path, spec) of the value that starts now
+        top = self.stack[-1]
+        if top["type"] is dict:
+            spec = top["spec"].get(top["key"]) if isinstance(top["spec"], dict) else None
+            return top["path"] + (top["key"],), spec
+        spec = top["spec"][0] if isinstance(top["spec"], list) and top["spec"] else None
+        return top["path"] + (top["count"],), spec
+
+    def _check_type(self, kind, path, spec):
+        if spec is not None and not isinstance(spec, kind):
+            raise SchemaError(f"{_path(path)} doit être de type {_type_name(spec)}")
+
+    def _start_value(self, c, position):
+        path, spec = self._child()
+        if c == "{":
+            self._check_type(dict, path, spec)
+            self._open(dict, spec, path)
+        elif c == "[":
+            self._check_type(list, path, spec)
+            self._open(list, spec, path)
+        elif c == '"':
+            self._check_type(str, path, spec)
+            self.in_string, self.string_is_key = True, False
+        elif c in _LITERAL_CHARS:
+            if isinstance(spec, (dict, list, str)):
+                raise SchemaError(f"{_path(path)} doit être de type {_type_name(spec)}")
+            self.literal = [c]
+        else:
+            raise self._unexpected(c)
+
+    def _end_literal(self):
+        text = "".join(self.literal)
+        self.literal = []
+        try:
+            json.loads(text)
+        except ValueError:
+            raise SchemaError(f"Valeur invalide {text!r} dans {_path(self._current_path())}")
+        self._value_done()
+
+    def _open(self, kind, spec, path):
+        self.stack.append({
+            "type": kind, "spec": spec, "path": path, "key": None, "seen": set(), "count": 0,
+            "state": "key_or_end" if kind is dict else "value_or_end",
+        })
+
+    def _got_key(self, key):
+        top = self.stack[-1]
+        top["key"] = key
+        top["seen"].add(key)
+        top["state"] = "colon"
+
+    def _value_done(self):
+        top = self.stack[-1]
+        top["count"] += 1
+        top["state"] = "comma_or_end"
+
+    def _close(self, position):
+        top = self.stack.pop()
+        if top["type"] is dict and isinstance(top["spec"], dict):
+            missing = [k for k in top["spec"] if k not in top["seen"]]
+            if missing:
+                raise SchemaError(f"Clé(s) manquante(s) dans {_path(top['path'])} : {', '.join(missing)}")
+        if self.stack:
+            self._value_done()
+        else:
+            self.end = position + 1
+
+
+def repair_prompt(answer, error, schema, max_chars=6000):
+    """Short prompt asking for the corrected JSON only (the analyses are not sent again)."""
+    if len(answer) > max_chars:
+        answer = answer[:max_chars] + " [...]"
+    return (
+        f"Ta réponse précédente n'est pas un JSON final valide ({error}).\n\n"
+        f"Réponse précédente :\n{answer}\n\n"
+        f"Renvoie UNIQUEMENT le JSON final corrigé, sans texte autour, avec exactement cette structure :\n"
+        f"{json.dumps(schema, ensure_ascii=False, indent=2)}"
+    )
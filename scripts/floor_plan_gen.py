@@ -1,48 +1,14 @@
+import io
 import json
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection, PatchCollection
 import matplotlib.patches as patches
 from matplotlib import cm
-import matplotlib.patheffects as path_effects
 import matplotlib.colors as mcolors
 
+from scripts.layout import layout_rooms
 
-
-
-#cleanup code later
-
-
-
-
-
-
-
-# -------------------------------------------------
-# 1) SAMPLE FLOOR PLAN (replace with your generated JSON)
-# -------------------------------------------------
-floorplan_json = """
-{
-  "rooms": [
-    {"name": "Living Room", "x":0, "y":0, "width":5, "height":4},
-    {"name": "Kitchen",      "x":5, "y":0, "width":3, "height":4},
-    {"name": "Bedroom 1",    "x":0, "y":4, "width":4, "height":3},
-    {"name": "Bathroom",     "x":4, "y":4, "width":2, "height":2}
-  ]
-}
-"""
-
-data = json.loads(floorplan_json)["rooms"]
-
-# -------------------------------------------------
-# 2) NOISE LEVELS (replace with your own data)
-# -------------------------------------------------
-noise_levels = {
-    "Living Room": 40,
-    "Kitchen": 55,
-    "Bedroom 1": 80,
-    "Bathroom": 90
-}
 # Map rating to color
 rating_colors = {
     'A': 'green',
@@ -53,151 +19,147 @@ rating_colors = {
     'F': 'darkorange',
     'G': 'red'
 }
-def get_rating(noise):
-    if noise <= 20: return 'A'
-    elif noise <= 35: return 'B'
-    elif noise <= 50: return 'C'
-    elif noise <= 65: return 'D'
-    elif noise <= 75: return 'E'
-    elif noise <= 90: return 'F'
-    else: return 'G'
-
-# -------------------------------------------------
-# 3) DRAW FLOOR PLAN + HEATMAP
-# -------------------------------------------------
-
-def draw_floorplan_to_pdf(rooms, noise_data, output="floorplan.pdf"):
-    max_x = max(room["x"] + room["width"] for room in rooms)
-    max_y = max(room["y"] + room["height"] for room in rooms)
-
-    with PdfPages(output) as pdf:
-        fig, ax = plt.subplots(figsize=(8, 6))
-
-        # ---- Draw room rectangles (white background)
-        for room in rooms:
-            rect = patches.Rectangle(
-                (room["x"], room["y"]),
-                room["width"],
-                room["height"],
-                linewidth=2,
-                edgecolor="black",
-                facecolor="white"
-            )
-            ax.add_patch(rect)
-
-        # ---- Create colormap
-        cmap = cm.get_cmap("hot")
-
-        # ---- Draw ripple waves
-        for room in rooms:
-            name = room["name"]
-            noise = noise_data.get(name, 0)
-
-            # Room center
-            cx = room["x"] + room["width"] / 2
-            cy = room["y"] + room["height"] / 2
-
-            # Number of ripple rings
-            # Increased ripple density
-            # Ultra dense ripple settings
-            rings = 10
-            max_radius =4.5
-            print(max_radius)
-            points = 120
-            clip_rect = patches.Rectangle(
-                (room["x"], room["y"]),
-                room["width"],
-                room["height"],
-                transform=ax.transData
-            )
-
-# Room‐based directional bias
-            direction_bias = (noise % 360) * np.pi / 180
-            noise_strength = (noise / 100)
-
-            for i in range(rings):
-                base_radius = (i + 1) * (max_radius / rings)
-                theta = np.linspace(0, 2*np.pi, points)
-
-    # Wavy distortion
-                distortion = (
-                    np.sin(theta * 6 + i * 0.7) * 0.06 +
-                    np.cos(theta * 5 + i * 0.3) * 0.05 +
-                    np.sin(theta * 4 + i) * 0.04
-                ) 
-                directional_wave = 0.08 * np.sin(theta - direction_bias)
-                
-
-                r = base_radius * (1 + distortion + directional_wave )
-                x = cx + r * np.cos(theta)
-                y = cy + r * np.sin(theta)
-
-                rating = get_rating(noise)
-                color = rating_colors[rating]
-                alpha = min(0.9, 0.2 + noise_strength)
-
-    # Draw ripple with clipping
-                line, = ax.plot(x, y, color=color, linewidth=1.1, alpha=alpha)
-                line.set_clip_path(clip_rect)
-
-    # Echo shadow ripple with clipping
-                shadow_offset = 0.02 * max_radius
-                line_shadow, = ax.plot(
-                    x ,
-                    y ,
-                    color=color ,
-                    linewidth=10,
-                    alpha=alpha * 0.15
-                )
-                line_shadow.set_clip_path(clip_rect)
-                line.set_path_effects([
-                    path_effects.Stroke(linewidth=12, foreground=color, alpha=0.1),
-                    path_effects.Normal()
-                ])
-
-
-            ax.text(
-                room["x"] + room["width"]/2,
-                room["y"] + room["height"]/2,
-                f"{room['name']}\n{noise_data.get(room['name'], '?')} dB",
-                ha='center', va='center',
-                fontsize=10, color="black",
-                bbox=dict(facecolor="white", alpha=0.3, edgecolor='none')
-            )
-
-        # ---- Add colorbar legend
-        ratings = list(rating_colors.keys())
-        colors = [rating_colors[r] for r in ratings]
-
-
-        cmap = mcolors.ListedColormap(colors)
-        bounds = list(range(len(ratings)+1))  # 0 to 7
-        norm = mcolors.BoundaryNorm(bounds, cmap.N)
-
-        sm = cm.ScalarMappable(cmap=cmap, norm=norm)
-        sm.set_array([])
-        
-        
-        cbar = fig.colorbar(sm, ax=ax, ticks=np.arange(0.5, len(ratings)+0.5))
-        cbar.ax.set_yticklabels(ratings)  # show letters instead of numbers
-        cbar.set_label("Noise Rating")
-
-        # ---- Final layout
-        ax.set_xlim(0, max_x)
-        ax.set_ylim(0, max_y)
-        ax.set_aspect("equal", adjustable="box")
-        ax.set_title("Apartment Floor Plan with Noise Ripple Waves")
-        ax.set_xlabel("Meters (approx)")
-        ax.set_ylabel("Meters (approx)")
-        ax.grid(False)
-
-        pdf.savefig(fig)
-        plt.close(fig)
-
-
-# -------------------------------------------------
-# 4) RUN IT
-# -------------------------------------------------
-draw_floorplan_to_pdf(data, noise_levels)
-
-print("PDF successfully generated: floorplan.pdf")
+RATING_BOUNDS = [20, 35, 50, 65, 75, 90]  # upper bound (inclusive) of A..F
+
+# Ripple settings
+RINGS = 10
+POINTS = 120
+RADIUS_FACTOR = 1.0  # outer ring radius, relative to the room's longest side
+
+
+def _ripple_segments(x, y, w, h, noise):
+    """All ripple rings of all rooms in one pass: (rooms * RINGS, POINTS, 2), NaN outside each room."""
+    theta = np.linspace(0, 2 * np.pi, POINTS)
+    ring = np.arange(RINGS)[:, None]
+
+    # Wavy distortion, shared by every room
+    distortion = (
+        np.sin(theta * 6 + ring * 0.7) * 0.06 +
+        np.cos(theta * 5 + ring * 0.3) * 0.05 +
+        np.sin(theta * 4 + ring) * 0.04
+    )                                                               # (RINGS, POINTS)
+    # Room-based directional bias
+    direction_bias = (noise % 360) * np.pi / 180
+    directional_wave = 0.08 * np.sin(theta[None, :] - direction_bias[:, None])  # (rooms, POINTS)
+
+    max_radius = RADIUS_FACTOR * np.maximum(w, h)
+    base_radius = (ring[None, :, :] + 1) * (max_radius[:, None, None] / RINGS)
+    r = base_radius * (1 + distortion[None] + directional_wave[:, None, :])   # (rooms, RINGS, POINTS)
+
+    cx = (x + w / 2)[:, None, None]
+    cy = (y + h / 2)[:, None, None]
+    px = cx + r * np.cos(theta)
+    py = cy + r * np.sin(theta)
+
+    # Clip to the room: points outside become NaN, which breaks the line there
+    outside = (
+        (px < x[:, None, None]) | (px > (x + w)[:, None, None]) |
+        (py < y[:, None, None]) | (py > (y + h)[:, None, None])
+    )
+    px[outside] = np.nan
+    py[outside] = np.nan
+    return np.stack([px, py], axis=-1).reshape(-1, POINTS, 2)
+
+
+def render_floorplan(rooms, noise_data, fmt="png", dpi=150, y_down=True, unit="px",
+                     title="Apartment Floor Plan with Noise Ripple Waves"):
+    """
+    Draw the plan with one noise ripple per room and return the image bytes
+    (`fmt` is any matplotlib format: "png", "pdf", "svg"...). `noise_data`
+    maps room name -> LAeq in dB. Layouts from the floor planner use screen
+    coordinates (`y_down`).
+    """
+    x = np.array([room["x"] for room in rooms], dtype=float)
+    y = np.array([room["y"] for room in rooms], dtype=float)
+    w = np.array([room["width"] for room in rooms], dtype=float)
+    h = np.array([room["height"] for room in rooms], dtype=float)
+    measured = np.array([room["name"] in noise_data for room in rooms])
+    noise = np.array([float(noise_data.get(room["name"]) or 0) for room in rooms])
+
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+
+    # ---- Draw room rectangles (white background)
+    ax.add_collection(PatchCollection(
+        [patches.Rectangle((room["x"], room["y"]), room["width"], room["height"]) for room in rooms],
+        linewidth=2, edgecolor="black", facecolor="white"
+    ))
+
+    # ---- Draw ripple waves: two artists for the whole plan
+    if measured.any():
+        ratings = np.searchsorted(RATING_BOUNDS, noise[measured])
+        palette = np.array([mcolors.to_rgba(c) for c in rating_colors.values()])
+        rgba = palette[ratings]
+        rgba[:, 3] = np.minimum(0.9, 0.2 + noise[measured] / 100)
+        rgba = np.repeat(rgba, RINGS, axis=0)
+        segments = _ripple_segments(x[measured], y[measured], w[measured], h[measured], noise[measured])
+
+        # Echo shadow under the ripples
+        shadow = rgba.copy()
+        shadow[:, 3] *= 0.15
+        ax.add_collection(LineCollection(segments, colors=shadow, linewidths=10))
+        ax.add_collection(LineCollection(segments, colors=rgba, linewidths=1.1))
+
+    for room in rooms:
+        level = noise_data.get(room["name"])
+        ax.text(
+            room["x"] + room["width"] / 2,
+            room["y"] + room["height"] / 2,
+            f"{room['name']}\n{'?' if level is None else round(level, 1)} dB",
+            ha='center', va='center',
+            fontsize=10, color="black",
+            bbox=dict(facecolor="white", alpha=0.3, edgecolor='none')
+        )
+
+    # ---- Add colorbar legend
+    ratings = list(rating_colors.keys())
+    cmap = mcolors.ListedColormap([rating_colors[r] for r in ratings])
+    norm = mcolors.BoundaryNorm(list(range(len(ratings) + 1)), cmap.N)
+    sm = cm.ScalarMappable(cmap=cmap, norm=norm)
+    sm.set_array([])
+    cbar = fig.colorbar(sm, ax=ax, ticks=np.arange(0.5, len(ratings) + 0.5))
+    cbar.ax.set_yticklabels(ratings)  # show letters instead of numbers
+    cbar.set_label("Noise Rating")
+
+    # ---- Final layout
+    if rooms:
+        ax.set_xlim(x.min(), (x + w).max())
+        ax.set_ylim(y.min(), (y + h).max())
+    if y_down:
+        ax.invert_yaxis()
+    ax.set_aspect("equal", adjustable="box")
+    ax.set_title(title)
+    ax.set_xlabel(f"Plan ({unit})")
+    ax.grid(False)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt, dpi=dpi)
+    return buf.getvalue()
+
+
+def draw_floorplan_to_pdf(rooms, noise_data, output="floorplan.pdf", **kwargs):
+    with open(output, "wb") as f:
+        f.write(render_floorplan(rooms, noise_data, fmt="pdf", **kwargs))
+
+
+if __name__ == "__main__":
+    # Demo on a hand-written plan (meters, y up)
+    floorplan_json = """
+    {
+      "rooms": [
+        {"name": "Living Room", "x":0, "y":0, "width":5, "height":4},
+        {"name": "Kitchen",      "x":5, "y":0, "width":3, "height":4},
+        {"name": "Bedroom 1",    "x":0, "y":4, "width":4, "height":3},
+        {"name": "Bathroom",     "x":4, "y":4, "width":2, "height":2}
+      ]
+    }
+    """
+    noise_levels = {
+        "Living Room": 40,
+        "Kitchen": 55,
+        "Bedroom 1": 80,
+        "Bathroom": 90
+    }
+    draw_floorplan_to_pdf(layout_rooms(json.loads(floorplan_json)), noise_levels,
+                          y_down=False, unit="m")
+    print("PDF successfully generated: floorplan.pdf")
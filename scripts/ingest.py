@@ -0,0 +1,119 @@
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+from scripts.columnar_store import RATINGS
+
+LOG_EXTENSION = ".ndjson"
+MAX_LINE_BYTES = 64 * 1024
+FLUSH_LINES = 1000       # validated lines buffered before each append
+READ_CHUNK_SIZE = 64 * 1024
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _log_lock(path):
+    key = os.path.abspath(path)
+    with _locks_guard:
+        if key not in _locks:
+            _locks[key] = threading.Lock()
+        return _locks[key]
+
+
+def validate_record(record, box_id=None):
+    """Error message for a measurement that doesn't follow the box schema, else None."""
+    if not isinstance(record, dict):
+        return "record must be a JSON object"
+    if not isinstance(record.get("box_id"), str) or not record["box_id"]:
+        return "box_id must be a non-empty string"
+    if box_id and record["box_id"] != box_id:
+        return f"box_id {record['box_id']!r} does not match {box_id!r}"
+    try:
+        datetime.strptime(record.get("timestamp") or "", "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return "timestamp must be 'YYYY-MM-DD HH:MM:SS'"
+    laeq = record.get("LAeq_segment_dB")
+    if isinstance(laeq, bool) or not isinstance(laeq, (int, float)) or not math.isfinite(laeq):
+        return "LAeq_segment_dB must be a number"
+    rating = record.get("LAeq_rating")
+    if rating is not None and rating not in RATINGS:
+        return f"LAeq_rating must be one of {', '.join(RATINGS)}"
+    labels = record.get("top_5_labels")
+    if not isinstance(labels, list) or len(labels) > 5 or not all(isinstance(l, str) for l in labels):
+        return "top_5_labels must be a list of at most 5 strings"
+    return None
+
+
+def iter_lines(stream, chunk_size=READ_CHUNK_SIZE, max_line=MAX_LINE_BYTES):
+    """
+    Yield (line_number, bytes) from a binary stream without holding more
+    than one chunk plus one line in memory. Over-long lines are yielded
+    as None.
+    """
+    pending = b""
+    skipping = False
+    number = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            number += 1
+            if skipping:
+                skipping = False
+                yield number, None
+            else:
+                yield number, line if len(line) <= max_line else None
+        if len(pending) > max_line:
+            pending = b""
+            skipping = True
+    if pending or skipping:
+        yield number + 1, None if skipping else pending
+
+
+def ingest_stream(stream, log_path, box_id=None, max_errors=20):
+    """
+    Validate newline-delimited records from `stream` and append the good
+    ones to `log_path`, FLUSH_LINES at a time. Returns counts and the
+    first `max_errors` errors.
+    """
+    accepted = rejected = 0
+    errors = []
+    batch = []
+
+    def flush():
+        if batch:
+            with _log_lock(log_path), open(log_path, "ab") as f:
+                f.write(b"".join(batch))
+            batch.clear()
+
+    for number, line in iter_lines(stream):
+        if line is not None and not line.strip():
+            continue
+        error = "line too long" if line is None else None
+        if error is None:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                error = "invalid JSON"
+            else:
+                error = validate_record(record, box_id)
+        if error:
+            rejected += 1
+            if len(errors) < max_errors:
+                errors.append({"line": number, "error": error})
+            continue
+
+        # Re-serialised compactly: one record per line, whatever the client sent
+        batch.append(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        accepted += 1
+        if len(batch) >= FLUSH_LINES:
+            flush()
+    flush()
+
+    return {"accepted": accepted, "rejected": rejected, "errors": errors}
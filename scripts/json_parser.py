@@ -1,11 +1,29 @@
+import codecs
 import json
 from datetime import datetime, timedelta
 import os
+
+import shutil
+
+import numpy as np
+
+from scripts import metrics
+from scripts.file_utils import atomic_write
+from scripts.columnar_store import COLUMNAR_FOLDER, RATINGS, ColumnBuilder, room_dir_for
+from scripts.manifest import MANIFEST_PATH, load_manifest, save_manifest, hash_file, file_signature, prefix_digest
+from scripts.resample import EXCEEDANCE_LEVELS, parse_timestamps, format_timestamps, resample
+INPUT_EXTENSIONS = (".json", ".ndjson")  # uploaded files / streamed logs
 INPUT_FILE = "original.json"
 OUTPUT_FILE = "sampled_2min.json"
 
-FIELDS = ["box_id", "LAeq_segment_dB", "LAeq_rating", "top_5_labels"]
+FIELDS = ["box_id", "timestamp", "LAeq_segment_dB", "LAeq_rating", "top_5_labels"]
 INTERVAL = timedelta(minutes=2)
+BATCH_SIZE = 8192  # raw records aggregated per vectorised pass
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_RECORD_CHARS = 1024 * 1024  # a single record bigger than this means the file is broken
+
+_decoder = json.JSONDecoder()
 
 
 def parse_time(ts):
@@ -16,55 +34,458 @@ def filter_fields(entry):
     return {k: entry.get(k) for k in FIELDS}
 
 
-def sample_every_2_minutes(data):
-    sampled = []
-    last_kept_time = None
+def iter_json_array(f, offset=0, chunk_size=READ_CHUNK_SIZE):
+    """
+    Yield (record, end_offset) for each object of a top-level JSON array,
+    reading the binary file `f` chunk by chunk. `end_offset` is the byte
+    offset just after the record; passing it back as `offset` resumes there.
+
+    Newline-delimited files (one object per line, as written by the
+    streaming ingest endpoint) are read the same way; an incomplete last
+    line is left for the next run, since the box may still be appending.
+    """
+    f.seek(offset)
+    reader = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    byte_pos = offset   # byte offset of buf[pos] in the file
+    started = offset > 0
+    ndjson = False
+    eof = False
+
+    while True:
+        # Separators between records are plain ASCII: one byte per char
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+            byte_pos += 1
+
+        if pos < len(buf):
+            if not started:
+                if buf[pos] not in "[{":
+                    raise ValueError("Expected a JSON array or newline-delimited records")
+                started = True
+                ndjson = buf[pos] == "{"
+                if not ndjson:
+                    pos += 1
+                    byte_pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                record, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof and (ndjson or offset > 0) and "\n" not in buf[pos:]:
+                    return   # partial last line of a log still being written
+                if eof or len(buf) - pos > MAX_RECORD_CHARS:
+                    raise
+            else:
+                if not isinstance(record, dict):
+                    raise ValueError(f"Expected a JSON object at byte {byte_pos}")
+                byte_pos += len(buf[pos:end].encode("utf-8"))
+                pos = end
+                yield record, byte_pos
+                continue
+        elif eof:
+            if started and offset == 0 and not ndjson:
+                raise ValueError("Unterminated JSON array")
+            return
+
+        # Need more data: drop what was consumed and read the next chunk
+        buf = buf[pos:]
+        pos = 0
+        chunk = f.read(chunk_size)
+        if chunk:
+            buf += reader.decode(chunk)
+        else:
+            buf += reader.decode(b"", final=True)
+            eof = True
+
+
+def iter_records(f, offset=0):
+    for record, _ in iter_json_array(f, offset):
+        yield record
+
+
+def iter_tracked(f, position, offset=0):
+    """iter_records that keeps position["offset"] at the end of the last record read."""
+    position["offset"] = offset
+    for record, end in iter_json_array(f, offset):
+        position["offset"] = end
+        yield record
+
+
+def _encode_labels(batch):
+    names = np.array(
+        [(list(r.get("top_5_labels") or []) + [""] * 5)[:5] for r in batch], dtype=object
+    ).reshape(-1, 5).astype(str)
+    vocab, codes = np.unique(names, return_inverse=True)
+    codes = codes.reshape(names.shape)
+    if vocab.size and vocab[0] == "":
+        vocab, codes = vocab[1:], codes - 1   # "" sorts first: empty slots become -1
+    return vocab, codes
+
 
-    for entry in data:
-        current_time = parse_time(entry["timestamp"])
+def _aggregate(batch, bucket_seconds, timestamps=None):
+    """One output record per bucket of `batch` (energetic mean, max, L10/L50/L90, label counts)."""
+    if not batch:
+        return []
+    if timestamps is None:
+        timestamps = parse_timestamps([r["timestamp"] for r in batch])
+    laeq = np.array([r.get("LAeq_segment_dB") for r in batch], dtype=np.float64)
+    vocab, codes = _encode_labels(batch)
+    res = resample(timestamps, laeq, codes, vocab.size, bucket_seconds)
+    n_buckets = res["start"].size
+    record_bucket = res["bucket"]
+    kept = record_bucket >= 0
 
-        if last_kept_time is None or (current_time - last_kept_time) >= INTERVAL:
-            sampled.append(filter_fields(entry))
-            last_kept_time = current_time
+    # Worst rating of the bucket, and box_id of its first record
+    ratings = np.array([RATINGS.find(r.get("LAeq_rating") or "?") for r in batch])
+    worst = np.full(n_buckets, -1)
+    np.maximum.at(worst, record_bucket[kept], ratings[kept])
+    first_bucket, first_index = np.unique(record_bucket[kept], return_index=True)
+    first_record = np.flatnonzero(kept)[first_index]
 
+    top = np.argsort(-res["label_counts"], axis=1, kind="stable")[:, :5]
+    starts = format_timestamps(res["start"])
+
+    sampled = []
+    for b in range(n_buckets):
+        counts = res["label_counts"][b]
+        sampled.append({
+            "box_id": batch[first_record[b]].get("box_id"),
+            "timestamp": str(starts[b]),
+            "LAeq_segment_dB": round(float(res["laeq"][b]), 2),
+            "LAeq_rating": RATINGS[worst[b]] if worst[b] >= 0 else None,
+            "top_5_labels": [str(vocab[i]) for i in top[b] if counts[i]],
+            "LAeq_max_dB": round(float(res["max"][b]), 2),
+            "L10_dB": round(float(res["L10"][b]), 2),
+            "L50_dB": round(float(res["L50"][b]), 2),
+            "L90_dB": round(float(res["L90"][b]), 2),
+            "records": int(res["count"][b]),
+            "label_counts": {str(vocab[i]): int(counts[i]) for i in np.flatnonzero(counts)},
+        })
     return sampled
 
 
+# -------------------------
+# Open bucket
+# -------------------------
+# The latest bucket may still receive records (next batch, or next run when
+# the input grows). It is kept as running aggregates, not raw records, so
+# its cost and its size in the manifest don't grow with the bucket:
+#   {"bucket", "count", "energy", "levels": [[dB, n], ...], "worst", "box_id", "labels": {label: n}}
+# Levels are kept as value counts: the box reports 2 decimals, so there are
+# few distinct values and L10/L50/L90 stay exact.
+
+def _open_partial(records, bucket):
+    levels = {}
+    labels = {}
+    partial = {"bucket": int(bucket), "count": 0, "energy": 0.0, "levels": [], "worst": -1,
+               "box_id": None, "labels": labels}
+    for r in records:
+        laeq = r.get("LAeq_segment_dB")
+        if laeq is None or not np.isfinite(laeq):
+            continue
+        if partial["count"] == 0:
+            partial["box_id"] = r.get("box_id")
+        partial["count"] += 1
+        partial["energy"] += 10 ** (laeq / 10)
+        levels[laeq] = levels.get(laeq, 0) + 1
+        partial["worst"] = max(partial["worst"], RATINGS.find(r.get("LAeq_rating") or "?"))
+        for label in (r.get("top_5_labels") or [])[:5]:
+            if label:
+                labels[label] = labels.get(label, 0) + 1
+    partial["levels"] = sorted([level, n] for level, n in levels.items())
+    return partial
+
+
+def _merge_partial(a, b):
+    """`b` (later records of the same bucket) folded into `a`."""
+    if a["count"] == 0:
+        return dict(b, bucket=a["bucket"])
+    levels = dict((level, n) for level, n in a["levels"])
+    for level, n in b["levels"]:
+        levels[level] = levels.get(level, 0) + n
+    labels = dict(a["labels"])
+    for label, n in b["labels"].items():
+        labels[label] = labels.get(label, 0) + n
+    return dict(a, count=a["count"] + b["count"], energy=a["energy"] + b["energy"],
+                levels=sorted([level, n] for level, n in levels.items()),
+                worst=max(a["worst"], b["worst"]), labels=labels)
+
+
+def _level_percentile(values, cumulative, q):
+    # np.percentile's linear interpolation, on sorted distinct values with their cumulative counts
+    pos = (cumulative[-1] - 1) * q
+    lo, hi = int(np.floor(pos)), int(np.ceil(pos))
+    v_lo = values[np.searchsorted(cumulative, lo, side="right")]
+    v_hi = values[np.searchsorted(cumulative, hi, side="right")]
+    return v_lo + (v_hi - v_lo) * (pos - lo)
+
+
+def _finish_partial(partial, bucket_seconds):
+    """Output record of an open bucket, same fields as _aggregate."""
+    if partial["count"] == 0:
+        return []
+    values = np.array([level for level, _ in partial["levels"]], dtype=np.float64)
+    cumulative = np.cumsum([n for _, n in partial["levels"]])
+    levels = {
+        f"L{level}_dB": round(float(_level_percentile(values, cumulative, 1 - level / 100)), 2)
+        for level in EXCEEDANCE_LEVELS
+    }
+    labels = sorted(partial["labels"].items(), key=lambda item: (-item[1], item[0]))
+    return [{
+        "box_id": partial["box_id"],
+        "timestamp": str(format_timestamps([partial["bucket"] * bucket_seconds])[0]),
+        "LAeq_segment_dB": round(float(10 * np.log10(partial["energy"] / partial["count"])), 2),
+        "LAeq_rating": RATINGS[partial["worst"]] if partial["worst"] >= 0 else None,
+        "top_5_labels": [label for label, _ in labels[:5]],
+        "LAeq_max_dB": round(float(values[-1]), 2),
+        **levels,
+        "records": partial["count"],
+        "label_counts": dict(sorted(partial["labels"].items())),
+    }]
+
+
+def iter_sampled(records, interval=INTERVAL, state=None, batch_size=BATCH_SIZE):
+    """
+    Aggregate records into `interval` buckets, BATCH_SIZE records at a time.
+
+    `state` carries the sampler position between runs: "pending" holds the
+    running aggregates of the last bucket (it may still grow when the input
+    file is appended to) and "pending_emitted" how many output records that
+    bucket produced at the end of this run.
+    """
+    state = {} if state is None else state
+    bucket_seconds = int(interval.total_seconds())
+    pending = state.get("pending")
+
+    def flush(batch):
+        nonlocal pending
+        timestamps = parse_timestamps([r["timestamp"] for r in batch])
+        buckets = timestamps // bucket_seconds
+        last = int(buckets.max())
+        if pending is not None and pending["bucket"] != last:
+            # The carried bucket is complete once a later one has started
+            own = buckets == pending["bucket"]
+            yield from _finish_partial(_merge_partial(pending, _open_partial(
+                [r for r, o in zip(batch, own) if o], pending["bucket"])), bucket_seconds)
+            pending = None
+            batch, timestamps, buckets = [r for r, o in zip(batch, own) if not o], timestamps[~own], buckets[~own]
+        is_open = buckets == last
+        yield from _aggregate([r for r, o in zip(batch, is_open) if not o], bucket_seconds, timestamps[~is_open])
+        still_open = _open_partial([r for r, o in zip(batch, is_open) if o], last)
+        pending = still_open if pending is None else _merge_partial(pending, still_open)
+
+    batch = []
+    for entry in records:
+        batch.append(filter_fields(entry))
+        if len(batch) >= batch_size:
+            yield from flush(batch)
+            batch = []
+    if batch:
+        yield from flush(batch)
+
+    tail = _finish_partial(pending, bucket_seconds) if pending is not None else []
+    state["pending"] = pending
+    state["pending_emitted"] = len(tail)
+    yield from tail
 
-def process_and_sample_folder(input_folder="data/rooms", output_folder="exports/parsed_json"):
+
+def sample_every_2_minutes(data, interval=INTERVAL):
+    return list(iter_sampled(data, interval))
+
+
+def _write_record(f, record, first):
+    text = ("[\n    " if first else ",\n    ") + json.dumps(record, indent=4).replace("\n", "\n    ")
+    f.write(text)
+    return len(text)  # json.dumps escapes non-ASCII: chars == bytes
+
+
+def write_json_array(records, output_path):
+    """
+    Write records as an indented JSON array one at a time. Returns the
+    count and the byte length of the file before its last record.
+    """
+    count = 0
+    length = last_start = 0
+    with atomic_write(output_path) as f:
+        for record in records:
+            last_start = length
+            length += _write_record(f, record, count == 0)
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count, last_start
+
+
+def append_json_array(records, output_path, body_length):
+    """
+    Append records to an array written by write_json_array. `body_length`
+    is the byte length to keep (without the closing bracket); anything
+    after it (e.g. an append interrupted before the manifest was saved,
+    or the previous version of a still-open bucket) is overwritten.
+    Returns the same tuple as write_json_array.
+    """
+    count = 0
+    length = last_start = body_length
+    with open(output_path, "r+") as f:
+        f.truncate(body_length)
+        f.seek(body_length)
+        for record in records:
+            last_start = length
+            length += _write_record(f, record, False)
+            count += 1
+        f.write("\n]")
+    return count, last_start
+
+
+def _outputs_exist(entry):
+    return all(os.path.exists(p) for p in entry.get("outputs", []))
+
+
+def _remove_outputs(entry):
+    for path in entry.get("outputs", []):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def _parser_id(interval):
+    # Stored per manifest entry: changing the sampler invalidates old outputs
+    return f"buckets-v2:{int(interval.total_seconds())}s"
+
+
+def _process_file(input_path, output_path, room_dir, entry, interval=INTERVAL):
+    """
+    (Re)build the outputs of one input. Returns (status, new manifest entry).
+    An input that only grew since `entry` has just its tail parsed.
+    """
+    if entry and entry.get("parser") != _parser_id(interval):
+        entry = None
+
+    signature = file_signature(input_path)
+    if entry and _outputs_exist(entry) and all(entry[k] == signature[k] for k in signature):
+        return "unchanged", entry
+
+    resume = entry.get("resume") if entry and _outputs_exist(entry) else None
+    prefix_length = resume["input_offset"] if resume else None
+    # The last records end in the last chunk: the new resume digest goes on from there
+    checkpoint = {}
+    digest, old_prefix_digest = hash_file(input_path, prefix_length, checkpoint)
+
+    if resume and digest == entry["sha256"]:
+        return "unchanged", dict(entry, **signature)
+
+    appending = bool(resume and resume["records"] and old_prefix_digest == resume["prefix_sha256"])
+    position = {}
+    sampler_state = dict(resume["sampler"]) if appending else {}
+    columns = ColumnBuilder.load(room_dir, resume["records"]) if appending else ColumnBuilder()
+
+    start_offset = resume["input_offset"] if appending else 0
+    with open(input_path, "rb") as f:
+        records = iter_tracked(f, position, start_offset)
+        records = metrics.counted(records, "sonalyze_records_parsed_total")
+        records = columns.collect(iter_sampled(records, interval, state=sampler_state))
+        if appending:
+            _, last_start = append_json_array(records, output_path, resume["output_length"])
+        else:
+            _, last_start = write_json_array(records, output_path)
+    columns.save(room_dir)
+    metrics.inc("sonalyze_bytes_read_total", position["offset"] - start_offset, stage="parse")
+    metrics.inc("sonalyze_bytes_written_total",
+                os.path.getsize(output_path) - (resume["output_length"] if appending else 0), stage="parse")
+
+    # The next run resumes before the last (still open) bucket and rebuilds it
+    open_records = sampler_state["pending_emitted"]
+    return ("appended" if appending else "processed"), dict(
+        signature,
+        sha256=digest,
+        parser=_parser_id(interval),
+        outputs=[output_path, room_dir],
+        records=len(columns),
+        resume={
+            "input_offset": position["offset"],
+            "prefix_sha256": prefix_digest(input_path, position["offset"], checkpoint),
+            "sampler": sampler_state,
+            "records": len(columns) - open_records,
+            "output_length": last_start if open_records else os.path.getsize(output_path) - 2,
+        },
+    )
+
+
+def process_and_sample_folder(input_folder="data/rooms", output_folder="exports/parsed_json",
+                              columnar_folder=COLUMNAR_FOLDER, manifest_path=MANIFEST_PATH,
+                              interval=INTERVAL):
     # Make sure output folder exists
     os.makedirs(output_folder, exist_ok=True)
-    
+
+    # The manifest remembers size/mtime/hash of every input and what it produced,
+    # so unchanged rooms are skipped and grown rolling logs only parse their tail
+    manifest = load_manifest(manifest_path)
+    known = manifest["files"]
     results_summary = []
 
     # Loop through all files in the input folder
-    for filename in os.listdir(input_folder):
-        if filename.endswith(".json"):
-            input_path = os.path.join(input_folder, filename)
-            output_path = os.path.join(output_folder, filename)
+    filenames = sorted(f for f in os.listdir(input_folder) if f.endswith(INPUT_EXTENSIONS))
 
-            # Load the file
-            with open(input_path, "r") as f:
-                data = json.load(f)
-
-            # Process / sample every 2 minutes
-            result = sample_every_2_minutes(data)
-
-            # Save the result
-            with open(output_path, "w") as f:
-                json.dump(result, f, indent=4)
-
-            # Add summary
+    # One input per room: <room>.json and <room>.ndjson would write the same outputs.
+    # The uploaded file wins; the other one is reported and left unparsed.
+    by_room = {}
+    for filename in filenames:
+        by_room.setdefault(os.path.splitext(filename)[0], []).append(filename)
+    for room_name, inputs in by_room.items():
+        winner = min(inputs, key=lambda f: INPUT_EXTENSIONS.index(os.path.splitext(f)[1]))
+        for filename in inputs:
+            if filename == winner:
+                continue
+            filenames.remove(filename)
+            if known.pop(filename, None) is not None:
+                # It may have overwritten the room's outputs: rebuild them from the winner
+                known.pop(winner, None)
+            metrics.inc("sonalyze_parse_files_total", status="conflict")
             results_summary.append({
                 "file": filename,
-                "records": len(result),
-                "output_file": output_path
+                "status": "conflict",
+                "records": 0,
+                "output_file": None,
+                "error": f"{winner} already provides room {room_name!r}",
             })
 
+    for filename in filenames:
+        room_name = os.path.splitext(filename)[0]
+        input_path = os.path.join(input_folder, filename)
+        output_path = os.path.join(output_folder, room_name + ".json")
+        room_dir = room_dir_for(room_name, columnar_folder)
+
+        status, known[filename] = _process_file(input_path, output_path, room_dir, known.get(filename), interval)
+        metrics.inc("sonalyze_parse_files_total", status=status)
+        if status != "unchanged":
+            save_manifest(manifest, manifest_path)
+
+        # Add summary
+        results_summary.append({
+            "file": filename,
+            "status": status,
+            "records": known[filename]["records"],
+            "output_file": output_path
+        })
+
+    # Inputs deleted since the last run: drop what they produced
+    for filename in set(known) - set(filenames):
+        claimed = {path for entry in known.values() if entry is not known[filename] for path in entry.get("outputs", [])}
+        entry = known.pop(filename)
+        _remove_outputs(dict(entry, outputs=[p for p in entry.get("outputs", []) if p not in claimed]))
+        results_summary.append({"file": filename, "status": "removed", "records": 0, "output_file": None})
+    save_manifest(manifest, manifest_path)
+
     return {
         "message": "Done",
-        "processed_files": len(results_summary),
+        # Rooms with outputs (processed, appended or unchanged); conflicts and removals are only in details
+        "processed_files": len(filenames),
         "details": results_summary
     }
 
-process_and_sample_folder()
\ No newline at end of file
+
+if __name__ == "__main__":
+    print(process_and_sample_folder())
@@ -1,14 +1,24 @@
+import hashlib
+import io
 import json
 import os
+import threading
+from collections import OrderedDict
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.lib import colors
-import matplotlib
-matplotlib.use('Agg')
+
+from scripts import metrics
+
+CHART_CACHE_SIZE = 32  # rendered PNGs kept in memory, keyed by their input data
+
+_chart_cache = OrderedDict()
+_chart_lock = threading.Lock()
+
 # -------------------------
 # 1. LOAD JSON
 # -------------------------
@@ -17,9 +27,46 @@ def load_json(path):
         return json.load(f)
 
 # -------------------------
-# 2. CREATE PDF FROM STRUCTURED JSON WITH GRAPHS
+# 2. CHARTS (in memory, cached)
 # -------------------------
-def create_pdf_with_graphs(data, pdf_path):
+def _cached_chart(kind, payload, render):
+    """PNG bytes of a chart; `render` only runs for inputs not seen recently."""
+    key = hashlib.sha256(json.dumps([kind, payload], ensure_ascii=False).encode("utf-8")).hexdigest()
+    with _chart_lock:
+        if key in _chart_cache:
+            _chart_cache.move_to_end(key)
+            return _chart_cache[key]
+
+    png = render()
+    with _chart_lock:
+        _chart_cache[key] = png
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return png
+
+
+def render_pie_chart(labels, sizes, title):
+    def render():
+        # Figure API, no pyplot: no global state shared between threads
+        fig = Figure(figsize=(6, 6))
+        ax = fig.subplots()
+        ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
+        ax.axis('equal')
+        ax.set_title(title)
+        fig.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=150)
+        return buf.getvalue()
+
+    return _cached_chart("pie", [labels, sizes, title], render)
+
+
+# -------------------------
+# 3. CREATE PDF FROM STRUCTURED JSON WITH GRAPHS
+# -------------------------
+def create_pdf_with_graphs(data, pdf_path, floorplan_png=None):
+    # pdf_path: a file path, or any binary file object (e.g. io.BytesIO)
+    # floorplan_png: optional noise map of the apartment (scripts/floor_plan_gen.py)
     doc = SimpleDocTemplate(
         pdf_path, pagesize=A4,
         rightMargin=2*cm, leftMargin=2*cm,
@@ -48,6 +95,11 @@ def create_pdf_with_graphs(data, pdf_path):
     story.append(Paragraph(f"<b>Comparaison aux seuils:</b> {interp.get('comparaison_seuils', 'N/A')}", body_style))
     story.append(Spacer(1, 12))
 
+    if floorplan_png:
+        story.append(Paragraph("Plan acoustique du logement (LAeq moyen mesuré par pièce)", body_style))
+        story.append(Image(io.BytesIO(floorplan_png), width=16*cm, height=12*cm))
+        story.append(Spacer(1, 12))
+
     # -------------------------
     # ANALYSE DES BRUITS
     # -------------------------
@@ -83,16 +135,9 @@ def create_pdf_with_graphs(data, pdf_path):
             labels.append('Autres')
             sizes.append(others_count)
 
-        pie_path = "temp_sources_pie.png"
-        plt.figure(figsize=(6,6))
-        plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
-        plt.axis('equal')
-        plt.title('Répartition des sources dominantes')
-        plt.tight_layout()
-        plt.savefig(pie_path, dpi=150)
-        plt.close()
+        pie_png = render_pie_chart(labels, sizes, 'Répartition des sources dominantes')
         story.append(Paragraph("Graphique: Répartition des sources dominantes", body_style))
-        story.append(Image(pie_path, width=10*cm, height=10*cm))
+        story.append(Image(io.BytesIO(pie_png), width=10*cm, height=10*cm))
         story.append(Spacer(1, 12))
     else:
         story.append(Paragraph("Pas assez de données pour générer le graphique des sources.", body_style))
@@ -130,7 +175,8 @@ def create_pdf_with_graphs(data, pdf_path):
     # -------------------------
     try:
         doc.build(story)
-        print(f"PDF généré: {pdf_path}")
+        if isinstance(pdf_path, str):
+            print(f"PDF généré: {pdf_path}")
     except PermissionError:
         alt_name = pdf_path.replace('.pdf', '') + "_locked.pdf"
         doc = SimpleDocTemplate(alt_name, pagesize=A4,
@@ -139,16 +185,23 @@ def create_pdf_with_graphs(data, pdf_path):
         doc.build(story)
         print(f"Fichier cible verrouillé. PDF enregistré en tant que: {alt_name}")
 
-    # Cleanup temporary images
-    if os.path.exists("temp_sources_pie.png"):
-        os.remove("temp_sources_pie.png")
+
+def render_pdf_bytes(data, floorplan_png=None):
+    """The report as bytes, built entirely in memory."""
+    buf = io.BytesIO()
+    with metrics.timer("sonalyze_pdf_render_seconds"):
+        create_pdf_with_graphs(data, buf, floorplan_png)
+    pdf_bytes = buf.getvalue()
+    metrics.inc("sonalyze_bytes_written_total", len(pdf_bytes), stage="pdf")
+    return pdf_bytes
 
 
 # -------------------------
-# 3. MAIN
+# 4. MAIN
 # -------------------------
 
 
 def json_to_pdf(file_path,export_path):
     data_loaded = load_json(file_path)
-    create_pdf_with_graphs(data_loaded,export_path)
+    with metrics.timer("sonalyze_pdf_render_seconds"):
+        create_pdf_with_graphs(data_loaded,export_path)
@@ -0,0 +1,223 @@
+import os
+import threading
+
+import numpy as np
+
+from scripts.columnar_store import open_room_columns, store_lock
+from scripts.room_stats import DAY_START_HOUR, NIGHT_START_HOUR, TOP_LABELS
+
+# Inverted index over the label codes of a room store: one bitmap per label
+# (bit i set = record i has the label among its top 5) and one per hour of
+# the day, packed 8 records per byte. Label queries then combine a few
+# bitmaps instead of scanning the records. Written next to the columns.
+
+HOURS = 24
+BACKGROUND_HOURS_SHARE = 0.5  # present in at least this share of the recorded hours -> background noise
+
+# Number of set bits of every byte value (np.bitwise_count needs NumPy 2)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def index_path(room_dir):
+    return os.path.join(room_dir, "label_bitmaps.npy")
+
+
+def popcount(bitmap):
+    return int(_POPCOUNT[bitmap].sum(dtype=np.int64))
+
+
+def build_label_bitmaps(timestamp, label_codes, n_labels):
+    """(n_labels + 24, ceil(n / 8)) packed bitmaps: one row per label code, then one per hour of the day."""
+    timestamp = np.asarray(timestamp, dtype=np.int64)
+    label_codes = np.asarray(label_codes)  # (n, slots)
+    n = timestamp.size
+    dense = np.zeros((n_labels + HOURS, n), dtype=bool)
+    rows, slots = np.nonzero(label_codes >= 0)
+    dense[label_codes[rows, slots], rows] = True
+    dense[n_labels + (timestamp // 3600) % HOURS, np.arange(n)] = True
+    return np.packbits(dense, axis=1)
+
+
+def save_label_bitmaps(room_dir, timestamp, label_codes, n_labels):
+    np.save(index_path(room_dir), build_label_bitmaps(timestamp, label_codes, n_labels))
+
+
+def _signature(room_dir):
+    st = os.stat(os.path.join(room_dir, "meta.json"))
+    return st.st_ino, st.st_mtime_ns
+
+
+def open_label_index(room_dir):
+    """
+    {"bitmaps", "vocab", "code", "timestamp", "records"} of a room store,
+    memory-mapped and kept until the store is rewritten. Stores written
+    before the index existed get it built in memory.
+    """
+    # Columns and bitmaps of the same version: no swap while they are opened
+    with store_lock(room_dir).shared():
+        signature = _signature(room_dir)
+        with _cache_lock:
+            cached = _cache.get(room_dir)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        columns = open_room_columns(room_dir)
+        try:
+            bitmaps = np.load(index_path(room_dir), mmap_mode="r")
+        except FileNotFoundError:
+            bitmaps = None
+    vocab = list(columns["labels_vocab"])
+    if bitmaps is None:
+        bitmaps = build_label_bitmaps(columns["timestamp"], columns["labels"], len(vocab))
+    index = {
+        "bitmaps": bitmaps,
+        "vocab": vocab,
+        "code": {label: i for i, label in enumerate(vocab)},
+        "timestamp": columns["timestamp"],
+        "records": columns["records"],
+    }
+    with _cache_lock:
+        _cache[room_dir] = (signature, index)
+    return index
+
+
+# -------------------------
+# Queries
+# -------------------------
+
+def _empty(index):
+    return np.zeros(index["bitmaps"].shape[1], dtype=np.uint8)
+
+
+def _full(index):
+    return np.packbits(np.ones(index["records"], dtype=bool))
+
+
+def label_bitmap(index, label):
+    code = index["code"].get(label)
+    return _empty(index) if code is None else np.asarray(index["bitmaps"][code])
+
+
+def hours_bitmap(index, hours):
+    result = _empty(index)
+    for hour in hours:
+        result |= index["bitmaps"][len(index["vocab"]) + hour % HOURS]
+    return result
+
+
+def range_bitmap(index, start=None, stop=None):
+    # Records are time-sorted: a time range is one run of positions
+    ts = index["timestamp"]
+    i = 0 if start is None else int(np.searchsorted(ts, start))
+    j = index["records"] if stop is None else int(np.searchsorted(ts, stop))
+    bits = np.zeros(index["records"], dtype=bool)
+    bits[i:j] = True
+    return np.packbits(bits)
+
+
+def night_hours():
+    return [h % HOURS for h in range(NIGHT_START_HOUR, DAY_START_HOUR + HOURS)]
+
+
+def select(index, all_of=(), any_of=(), start=None, stop=None, hours=None):
+    """
+    Bitmap of the records that have every label of `all_of`, at least one
+    of `any_of` (when given), inside [start, stop) epoch seconds and within
+    `hours` (hours of the day).
+    """
+    result = _full(index)
+    for label in all_of:
+        result &= label_bitmap(index, label)
+    if any_of:
+        matched = _empty(index)
+        for label in any_of:
+            matched |= label_bitmap(index, label)
+        result &= matched
+    if start is not None or stop is not None:
+        result &= range_bitmap(index, start, stop)
+    if hours is not None:
+        result &= hours_bitmap(index, hours)
+    return result
+
+
+def positions(index, bitmap):
+    return np.flatnonzero(np.unpackbits(bitmap, count=index["records"]))
+
+
+def label_counts(index, bitmap):
+    """{label: records of the selection that have it}, most frequent first."""
+    n_labels = len(index["vocab"])
+    counts = _POPCOUNT[np.asarray(index["bitmaps"][:n_labels]) & bitmap].sum(axis=1, dtype=np.int64)
+    order = np.argsort(-counts, kind="stable")
+    return {index["vocab"][i]: int(counts[i]) for i in order if counts[i]}
+
+
+def cooccurrence(index, bitmap, labels=None):
+    """
+    {label: {other label: records with both}} within the selection,
+    for `labels` (default: every label present in it).
+    """
+    labels = list(label_counts(index, bitmap)) if labels is None else labels
+    codes = [index["code"][label] for label in labels if label in index["code"]]
+    n_labels = len(index["vocab"])
+    dense = np.unpackbits(np.asarray(index["bitmaps"][:n_labels]) & bitmap, axis=1, count=index["records"])
+    pairs = dense[codes].astype(np.int32) @ dense.T.astype(np.int32)
+    return {
+        index["vocab"][code]: {index["vocab"][j]: int(row[j]) for j in np.argsort(-row, kind="stable")
+                               if row[j] and j != code}
+        for code, row in zip(codes, pairs)
+    }
+
+
+def episodes(index, bitmap):
+    """(start, stop) epoch seconds of the runs of consecutive selected records."""
+    pos = positions(index, bitmap)
+    if pos.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(pos) > 1)
+    firsts = pos[np.concatenate(([0], breaks + 1))]
+    lasts = pos[np.concatenate((breaks, [pos.size - 1]))]
+    ts = index["timestamp"]
+    return [(int(ts[a]), int(ts[b])) for a, b in zip(firsts, lasts)]
+
+
+def label_recurrence(index, limit=TOP_LABELS):
+    """
+    For the most frequent labels: share of the recorded hours where they
+    occur, number of separate episodes and share at night, classified as
+    background ("fond") or occasional ("ponctuel") noise. The bitmaps of
+    the labels are unpacked once and every figure computed on all of them.
+    """
+    hour = np.asarray(index["timestamp"]) // 3600
+    if hour.size == 0:
+        return []
+    n_labels = len(index["vocab"])
+    packed = np.asarray(index["bitmaps"][:n_labels])
+    counts = _POPCOUNT[packed].sum(axis=1, dtype=np.int64)
+    codes = [c for c in np.argsort(-counts, kind="stable")[:limit] if counts[c]]
+    if not codes:
+        return []
+    packed = packed[codes]
+    dense = np.unpackbits(packed, axis=1, count=index["records"]).astype(bool)
+
+    # Records are time-sorted: each recorded hour is one run of positions
+    hour_starts = np.concatenate(([0], np.flatnonzero(np.diff(hour)) + 1))
+    hours_present = np.logical_or.reduceat(dense, hour_starts, axis=1).sum(axis=1)
+    episode_counts = dense[:, 0] + (dense[:, 1:] & ~dense[:, :-1]).sum(axis=1)
+    night = _POPCOUNT[packed & hours_bitmap(index, night_hours())].sum(axis=1, dtype=np.int64)
+
+    result = []
+    for k, code in enumerate(codes):
+        share = hours_present[k] / hour_starts.size
+        result.append({
+            "label": index["vocab"][code],
+            "occurrences": int(counts[code]),
+            "part_heures": round(float(share), 3),
+            "episodes": int(episode_counts[k]),
+            "part_nuit": round(float(night[k] / counts[code]), 3),
+            "type": "fond" if share >= BACKGROUND_HOURS_SHARE else "ponctuel",
+        })
+    return result
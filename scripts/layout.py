@@ -0,0 +1,27 @@
+# Saved floor plan layouts (what /layout/save writes), read by the floorplan
+# drawing and the noise propagation model. Kept free of heavy imports.
+
+
+def layout_rooms(layout):
+    """
+    Rooms of a saved layout (the /layout/save wrapper, its "layout" list,
+    or {"rooms": [...]}) as dicts with name/x/y/width/height. A room is
+    named after its attached JSON file, which is how measurements are
+    keyed.
+    """
+    if isinstance(layout, dict):
+        layout = layout.get("layout", layout.get("rooms", []))
+    rooms = []
+    for item in layout:
+        if not all(k in item for k in ("x", "y", "width", "height")):
+            continue
+        attached = item.get("attached_json")
+        name = attached.rsplit(".", 1)[0] if attached else item.get("name", item.get("id"))
+        rooms.append({
+            "name": name,
+            "x": float(item["x"]),
+            "y": float(item["y"]),
+            "width": float(item["width"]),
+            "height": float(item["height"]),
+        })
+    return rooms
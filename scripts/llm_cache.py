@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from scripts.config_api import LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_AGE
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_lock = threading.Lock()
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def cache_key(model, chat_history):
+    system = [m["content"] for m in chat_history if m["role"] == "system"]
+    messages = [m for m in chat_history if m["role"] != "system"]
+    payload = json.dumps(
+        {"model": model, "system": system, "messages": messages},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key, cache_dir):
+    return Path(cache_dir) / f"{key}.json"
+
+
+# An entry's age counts from when it was written (mtime, never touched
+# afterwards); its last use is its atime, set on every hit. Expiry in
+# cache_get and evict() both go by the mtime, size eviction by the atime.
+
+def cache_get(key, cache_dir=LLM_CACHE_DIR, max_age=LLM_CACHE_MAX_AGE):
+    path = _entry_path(key, cache_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        written = os.stat(path).st_mtime
+    except (FileNotFoundError, json.JSONDecodeError):
+        _count("misses")
+        return None
+
+    now = time.time()
+    if now - written > max_age:
+        path.unlink(missing_ok=True)
+        _count("evictions")
+        _count("misses")
+        return None
+
+    os.utime(path, (now, written))
+    _count("hits")
+    return entry["response"]
+
+
+def cache_put(key, response, cache_dir=LLM_CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _entry_path(key, cache_dir)
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"created": time.time(), "response": response}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    _count("stores")
+    evict(cache_dir)
+
+
+def evict(cache_dir=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES, max_age=LLM_CACHE_MAX_AGE):
+    entries = []
+    now = time.time()
+    for path in Path(cache_dir).glob("*.json"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        if now - st.st_mtime > max_age:
+            path.unlink(missing_ok=True)
+            _count("evictions")
+        else:
+            entries.append((st.st_atime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        _count("evictions")
+
+
+def _chunk(content):
+    # Same shape as a Groq stream chunk, so callers can't tell a hit from a live call
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+def replay_stream(response):
+    yield _chunk(response)
+
+
+def record_stream(stream, key, cache_dir=LLM_CACHE_DIR):
+    """Pass the chunks through and store the full response once the stream is exhausted."""
+    parts = []
+    for chunk in stream:
+        content = chunk.choices[0].delta.content
+        if content:
+            parts.append(content)
+        yield chunk
+    cache_put(key, "".join(parts), cache_dir)
@@ -1,27 +1,70 @@
-from groq import Groq
 from dotenv import load_dotenv
-import os
+import time
 
-from scripts.config_api import MODEL
+from scripts.config_api import MODEL, LLM_CACHE_BYPASS
+from scripts import metrics
+from scripts.llm_cache import cache_key, cache_get, replay_stream, record_stream
+from scripts.llm_gateway import stream_chat
 
 load_dotenv()
 
+# Optional limiter shared by several processes (see scripts/batch_reports.py).
+# Held for the whole stream, not just the request, since that is what the
+# provider counts as a concurrent call.
+_limiter = None
+
+def set_llm_limiter(limiter):
+	global _limiter
+	_limiter = limiter
+
 def read_file(file_path):
 	with open(file_path, "r") as file:
 		return file.read()
 
 
 
-def ask_llm(chat_history):
-	client = Groq(api_key=os.environ["GROQ_KEY"])
+def ask_llm(chat_history, use_cache=True):
+	start = time.perf_counter()
+	prompt_chars = sum(len(m["content"]) for m in chat_history)
+	use_cache = use_cache and not LLM_CACHE_BYPASS
+	if use_cache:
+		key = cache_key(MODEL, chat_history)
+		cached = cache_get(key)
+		metrics.inc("sonalyze_llm_cache_total", result="miss" if cached is None else "hit")
+		if cached is not None:
+			return _measured_stream(replay_stream(cached), "cache", start, prompt_chars)
+
+	if _limiter is not None:
+		stream_response = _limited_stream(chat_history, _limiter)
+	else:
+		stream_response = _create_stream(chat_history)
+
+	if use_cache:
+		stream_response = record_stream(stream_response, key)
+	return _measured_stream(stream_response, "live", start, prompt_chars)
+
+def _measured_stream(stream, source, start, prompt_chars):
+	# TTFT and stream time both count from the ask_llm call
+	metrics.inc("sonalyze_llm_requests_total", source=source)
+	metrics.observe("sonalyze_llm_prompt_chars", prompt_chars, source=source)
+	completion_chars = 0
+	for chunk in stream:
+		content = chunk.choices[0].delta.content
+		if content:
+			if not completion_chars:
+				metrics.observe("sonalyze_llm_ttft_seconds", time.perf_counter() - start, source=source)
+			completion_chars += len(content)
+		yield chunk
+	metrics.observe("sonalyze_llm_stream_seconds", time.perf_counter() - start, source=source)
+	metrics.observe("sonalyze_llm_completion_chars", completion_chars, source=source)
 
-	stream_response = client.chat.completions.create(
-	    messages=chat_history,
-	    stream=True,
-	    model=MODEL
-	)
+def _create_stream(chat_history):
+	# Shared client, rate limits and retries: see scripts/llm_gateway.py
+	return stream_chat(chat_history, MODEL)
 
-	return stream_response
+def _limited_stream(chat_history, limiter):
+	with limiter:
+		yield from _create_stream(chat_history)
 
 def read_stream_response(stream_response):
 	for chunk in stream_response:
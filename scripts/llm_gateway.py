@@ -0,0 +1,195 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from scripts import metrics
+from scripts.config_api import (
+    MODEL, LLM_BASE_URL, LLM_RPM, LLM_TPM, LLM_EXPECTED_COMPLETION_TOKENS, LLM_CHARS_PER_TOKEN,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_TIMEOUT,
+)
+
+# One gateway per process: a single Groq client (its HTTP connection pool is
+# reused by every call and thread), request/token budgets shared by all the
+# jobs of the process, and retries on rate limits and transient errors.
+
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously; acquire() blocks until enough are available."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Takes `amount` units, waiting if needed. Returns the seconds waited."""
+        if not self.capacity:
+            return 0.0
+        amount = min(amount, self.capacity)  # a call bigger than the budget still runs, alone
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.level >= amount:
+                        self.level -= amount
+                        return now - start
+                    wait = (amount - self.level) / self.rate
+                self._cond.wait(wait)
+
+    def adjust(self, amount):
+        """Gives back (amount < 0) or takes more (amount > 0) once the real cost is known."""
+        if not self.capacity:
+            return
+        with self._cond:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level - amount)
+            self._cond.notify_all()
+
+    def set_rate(self, per_minute):
+        with self._cond:
+            self._refill(time.monotonic())
+            self.capacity = per_minute
+            self.rate = per_minute / 60.0
+            self.level = min(self.level, per_minute)
+            self._cond.notify_all()
+
+    def block(self, seconds):
+        """Nobody gets through for `seconds` (the provider asked us to back off)."""
+        if not self.capacity:
+            return
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+requests_bucket = TokenBucket(LLM_RPM)
+tokens_bucket = TokenBucket(LLM_TPM)
+
+
+def share_budgets(processes):
+    """This process is one of `processes` using the same key: it gets its share of LLM_RPM / LLM_TPM."""
+    processes = max(1, processes)
+    requests_bucket.set_rate(LLM_RPM / processes)
+    tokens_bucket.set_rate(LLM_TPM / processes)
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Imported on the first real call: the SDK is slow to import and cache hits never need it
+            from groq import Groq
+            if LLM_BASE_URL:
+                api_key = os.environ.get("GROQ_KEY", "local")
+            else:
+                api_key = os.environ["GROQ_KEY"]
+            # Retries are done here, where they can see the shared budgets
+            _client = Groq(api_key=api_key, base_url=LLM_BASE_URL, max_retries=0, timeout=LLM_TIMEOUT)
+        return _client
+
+
+def estimate_tokens(chat_history):
+    prompt = sum(len(m["content"]) for m in chat_history) // LLM_CHARS_PER_TOKEN
+    return prompt + LLM_EXPECTED_COMPLETION_TOKENS
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_reason(error):
+    import groq
+    if isinstance(error, (groq.APITimeoutError, groq.APIConnectionError)):
+        return "connection"
+    status = getattr(error, "status_code", None)
+    if status in RETRY_STATUSES:
+        return "rate_limit" if status == 429 else f"http_{status}"
+    return None
+
+
+def backoff(attempt):
+    # Full jitter: spreads the retries of concurrent calls instead of syncing them
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _usage_tokens(chunk):
+    usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def stream_chat(chat_history, model=MODEL):
+    """
+    Chunks of a streamed chat completion. Waits for the request/token
+    budgets, and retries 429s, 5xx and connection errors with backoff —
+    only until the first chunk, since a half-delivered answer can't be
+    replayed transparently.
+    """
+    client = get_client()
+    estimate = estimate_tokens(chat_history)
+    attempt = 0
+    while True:
+        waited = requests_bucket.acquire(1) + tokens_bucket.acquire(estimate)
+        metrics.observe("sonalyze_llm_throttle_seconds", waited)
+        try:
+            stream = iter(client.chat.completions.create(messages=chat_history, stream=True, model=model))
+            first = next(stream, None)
+            break
+        except Exception as e:
+            reason = _retry_reason(e)
+            if reason is None or attempt >= LLM_MAX_RETRIES:
+                raise
+            delay = backoff(attempt)
+            retry_after = _retry_after(e)
+            if retry_after is not None:
+                delay = retry_after + random.uniform(0, LLM_BACKOFF_BASE)
+                if reason == "rate_limit":
+                    # Every call of the process waits, not just this one
+                    requests_bucket.block(retry_after)
+            metrics.inc("sonalyze_llm_retries_total", reason=reason)
+            attempt += 1
+            time.sleep(delay)
+
+    used = None
+    if first is not None:
+        used = _usage_tokens(first)
+        yield first
+    for chunk in stream:
+        used = _usage_tokens(chunk) or used
+        yield chunk
+    if used is not None:
+        tokens_bucket.adjust(used - estimate)
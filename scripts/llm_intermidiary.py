@@ -1,85 +1,277 @@
 import json
-import time
+import os
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from scripts import metrics
+from scripts.config_api import (
+    LLM_CONCURRENCY, LLM_ANALYSIS_MODE, LLM_MAP_REDUCE_MIN_HOURS, LLM_PROMPT_BUDGET_CHARS,
+)
+from scripts.file_utils import atomic_write
+from scripts.final_json import (
+    REPAIR_SYSTEM_PROMPT, SchemaError, StreamingValidator, repair_prompt, schema_from_context,
+)
 from scripts.llm_contact import ask_llm, read_file
+from scripts.map_reduce import SEPARATOR, reduce_to_budget
+from scripts.layout import layout_rooms
+from scripts.noise_propagation import evidence_lines, propagate
+from scripts.room_stats import (
+    summarize_arrays, records_to_arrays, columns_to_arrays, day_night_windows,
+)
+from scripts.columnar_store import COLUMNAR_FOLDER, open_room_columns, room_dir_for, room_exists
+from scripts.label_index import label_recurrence, open_label_index
 
 
-def send_to_llm(export_path):
+def collect_stream(stream):
+    response = ""
+    for chunk in stream:
+        content = chunk.choices[0].delta.content
+        if content:
+            response += content
+    return response
+
+
+def load_room_arrays(file_path, columnar_folder=COLUMNAR_FOLDER):
+    # Store colonnaire (mmap) s'il existe, sinon relecture du JSON
+    room_dir = room_dir_for(file_path.stem, columnar_folder)
+    if room_exists(room_dir):
+        return columns_to_arrays(open_room_columns(room_dir))
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        file_content = json.load(f)
+    return records_to_arrays(file_content)
+
+
+def summarize_file(file_path, columnar_folder=COLUMNAR_FOLDER):
+    return summarize_arrays(*load_room_arrays(file_path, columnar_folder), name=file_path.name)
+
+
+def _dumps(summary):
+    return json.dumps(summary, separators=(',', ':'), ensure_ascii=False)
+
+
+def _ask(sys_content, prompt, use_cache=True, slots=None):
+    # slots : sémaphore partagé par tous les appels d'une analyse (LLM_CONCURRENCY au total)
+    with slots or nullcontext():
+        return collect_stream(ask_llm(chat_history=[
+            {"role": "system", "content": sys_content},
+            {"role": "user", "content": prompt}
+        ], use_cache=use_cache))
+
+
+def analyse_file(file_path, summary, sys_content, use_cache=True, slots=None):
+    # Agrégation locale : le LLM reçoit un résumé compact au lieu des mesures brutes
+    json_str = json.dumps(summary, separators=(',', ':'), ensure_ascii=False)
+
+    # --- Appel backend ---
+    messages_intermediaires = [
+        {"role": "system", "content": sys_content},
+        {"role": "user", "content": f"Voici le résumé statistique du fichier '{file_path.name}' à traiter : {json_str}"}
+    ]
+
+    with slots or nullcontext():
+        partial_res = collect_stream(ask_llm(chat_history=messages_intermediaires, use_cache=use_cache))
+    print(f"✅ Fichier traité : {file_path.name}")
+    return f"--- Résultat pour {file_path.name} ---\n{partial_res}\n"
+
+
+def _no_event(event, data):
+    pass
+
+
+def stream_final_json(chat_history, schema, use_cache=True, on_event=_no_event):
+    """
+    Streams the final answer through the schema validator and returns the
+    parsed JSON. Stops reading as soon as the answer can't be valid; the
+    SchemaError then carries what was received in `answer`. Once the JSON
+    is complete, the rest of the stream is still read (not validated) so
+    the cache, metrics and token accounting at its end run.
+    """
+    validator = StreamingValidator(schema)
+    stream = ask_llm(chat_history=chat_history, use_cache=use_cache)
+    full_response = ""
+    try:
+        for chunk in stream:
+            content = chunk.choices[0].delta.content
+            if not content or validator.done:
+                continue  # la suite éventuelle n'est que du texte autour du JSON
+            full_response += content
+            on_event("token", {"text": content})
+            validator.feed(content)
+        return validator.close()
+    except SchemaError as e:
+        e.answer = full_response
+        raise
+    finally:
+        if hasattr(stream, "close"):
+            stream.close()
+
+
+def use_map_reduce(mode, timestamps):
+    if mode == "direct" or timestamps is None or len(timestamps) == 0:
+        return False
+    if mode == "map_reduce":
+        return True
+    return int(timestamps.max() - timestamps.min()) > LLM_MAP_REDUCE_MIN_HOURS * 3600
+
+
+def analyse_file_windows(file_path, arrays, summary, sys_content, use_cache=True,
+                         concurrency=LLM_CONCURRENCY, budget=LLM_PROMPT_BUDGET_CHARS, on_event=_no_event,
+                         slots=None):
+    # Map : une analyse par période jour/nuit, en parallèle.
+    # Reduce : fusions successives dans la limite du budget, puis une fusion finale
+    # avec le résumé de l'enregistrement complet. Aucune période n'est ignorée.
+    name = file_path.name
+    windows = day_night_windows(arrays[0])
+
+    def analyse_window(window):
+        label, start, stop = window
+        part = summarize_arrays(*(a[start:stop] for a in arrays), name=f"{name} ({label})")
+        result = _ask(sys_content, f"Voici le résumé statistique de la période « {label} » du fichier '{name}' à traiter : {_dumps(part)}", use_cache, slots)
+        on_event("window_done", {"file": name, "window": label, "total": len(windows)})
+        return f"--- {label} ---\n{result}"
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        window_results = list(executor.map(analyse_window, windows))
+
+    def merge(texts):
+        return _ask(sys_content, (
+            f"Voici les analyses de périodes successives du fichier '{name}'. "
+            f"Fusionne-les en une seule analyse individuelle (CAS 1) couvrant toutes ces périodes, "
+            f"en gardant les pics, les anomalies et les différences jour/nuit :\n\n{SEPARATOR.join(texts)}"
+        ), use_cache, slots)
+
+    global_json = _dumps(summary)
+    texts = reduce_to_budget(window_results, merge, budget - len(global_json), concurrency)
+    partial_res = _ask(sys_content, (
+        f"Voici le résumé statistique de l'enregistrement complet du fichier '{name}' : {global_json}\n\n"
+        f"Et les analyses de ses {len(windows)} périodes jour/nuit :\n\n{SEPARATOR.join(texts)}\n\n"
+        f"Fusionne le tout en une seule analyse individuelle (CAS 1) de ce fichier."
+    ), use_cache, slots)
+    print(f"✅ Fichier traité : {name} ({len(windows)} périodes)")
+    return f"--- Résultat pour {name} ---\n{partial_res}\n"
+
+
+def propagation_evidence(layout_path, summaries):
+    # Transferts entre pièces voisines, d'après le plan sauvegardé et les LAeq mesurés
+    if not layout_path or not os.path.exists(layout_path):
+        return None
+    with open(layout_path, "r", encoding="utf-8") as f:
+        rooms = layout_rooms(json.load(f))
+    levels = {
+        name: summary["niveaux"]["LAeq_moyen_dB"]
+        for name, summary in summaries.items() if summary.get("niveaux", {}).get("LAeq_moyen_dB") is not None
+    }
+    if not any(room["name"] in levels for room in rooms):
+        return None
+    return propagate(rooms, levels)
+
+
+def send_to_llm(export_path, concurrency=LLM_CONCURRENCY, use_cache=True,
+                parsed_folder="exports/parsed_json", columnar_folder=COLUMNAR_FOLDER,
+                on_event=_no_event, mode=LLM_ANALYSIS_MODE, budget=LLM_PROMPT_BUDGET_CHARS,
+                layout_path=None):
+    # on_event(event, data) reçoit la progression : "room_done" par fichier,
+    # puis "token" pour chaque morceau de la réponse de consolidation
     # -------------------------
     # 1. CHARGEMENT DU CONTEXTE
     # -------------------------
 
     sys_content = read_file("scripts/context.txt")
 
-
-        
-
     # -------------------------
     # 2. RÉCUPÉRER TOUS LES FICHIERS JSON D'UN DOSSIER
     # -------------------------
-    folder_path = Path("exports/parsed_json")  # Remplacez par votre dossier
-    uploaded_files = list(folder_path.glob("*.json"))
+    folder_path = Path(parsed_folder)
+    # Tri par nom : l'ordre du prompt de consolidation reste stable d'un run à l'autre
+    uploaded_files = sorted(folder_path.glob("*.json"))
 
     if not uploaded_files:
-        print(f"❌ Aucun fichier JSON trouvé dans {folder_path}")
-        exit(1)
-
-    analyses_partielles = []
+        raise FileNotFoundError(f"❌ Aucun fichier JSON trouvé dans {folder_path}")
 
     # -------------------------
-    # 3. TRAITEMENT FICHIER PAR FICHIER
+    # 3. TRAITEMENT DES FICHIERS EN PARALLÈLE
     # -------------------------
-    for i, file_path in enumerate(uploaded_files, start=1):
-        print(f"⚙️ Traitement du fichier {i}/{len(uploaded_files)} : {file_path.name}")
+    print(f"⚙️ Traitement de {len(uploaded_files)} fichier(s), {concurrency} en parallèle")
 
-        # Lecture du JSON
-        with open(file_path, "r", encoding="utf-8") as f:
-            file_content = json.load(f)
+    # Les pools imbriqués (pièces, périodes, fusions) ne limitent pas le total :
+    # c'est ce sémaphore, pris autour de chaque appel, qui tient LLM_CONCURRENCY
+    slots = threading.BoundedSemaphore(max(1, concurrency))
 
-        # Minification pour économiser les tokens
-        json_str = json.dumps(file_content, separators=(',', ':'), ensure_ascii=False)
-        if len(json_str) > 500_000:
-            json_str = json_str[:500_000] + "... (tronqué)"
+    def analyse(file_path):
+        arrays = load_room_arrays(file_path, columnar_folder)
+        summary = summarize_arrays(*arrays, name=file_path.name)
+        # Bruits de fond / ponctuels, depuis l'index des labels du store colonnaire
+        room_dir = room_dir_for(file_path.stem, columnar_folder)
+        if room_exists(room_dir):
+            summary["recurrence_labels"] = label_recurrence(open_label_index(room_dir))
+        if use_map_reduce(mode, arrays[0]):
+            result = analyse_file_windows(file_path, arrays, summary, sys_content, use_cache,
+                                          concurrency, budget, on_event, slots)
+        else:
+            result = analyse_file(file_path, summary, sys_content, use_cache, slots)
+        on_event("room_done", {"file": file_path.name, "total": len(uploaded_files)})
+        return summary, result
 
-        # --- Appel backend ---
-        messages_intermediaires = [
-            {"role": "system", "content": sys_content},
-            {"role": "user", "content": f"Voici le contenu du fichier '{file_path.name}' à traiter : {json_str}"}
-        ]
-
-        stream = ask_llm(chat_history=messages_intermediaires)
-
-        partial_res = ""
-        for chunk in stream:
-            content = chunk.choices[0].delta.content
-            if content:
-                partial_res += content
-
-        analyses_partielles.append(f"--- Résultat pour {file_path.name} ---\n{partial_res}\n")
-        print(f"✅ Fichier traité : {file_path.name}\n")
+    # map() rend les résultats dans l'ordre des fichiers, quel que soit l'ordre de fin
+    with metrics.timer("sonalyze_stage_seconds", stage="analyse"), \
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        resultats = list(executor.map(analyse, uploaded_files))
+    summaries = {f.stem: summary for f, (summary, _) in zip(uploaded_files, resultats)}
+    analyses_partielles = [res for _, res in resultats]
 
     # -------------------------
     # 4. CONSOLIDATION FINALE
     # -------------------------
     print("📑 Consolidation des résultats...")
+    on_event("stage", {"stage": "consolidate"})
+
+    # Trop de pièces pour un seul prompt : synthèses intermédiaires, par groupes
+    def merge_rooms(texts):
+        return _ask(sys_content, (
+            f"Voici les analyses individuelles de plusieurs pièces. Regroupe-les en une seule synthèse "
+            f"intermédiaire, pièce par pièce, en gardant pour chacune les niveaux, la note, les labels "
+            f"dominants et les anomalies. Ne produis pas encore le JSON final :\n\n{SEPARATOR.join(texts)}"
+        ), use_cache, slots) + "\n"
 
-    global_context = "\n".join(analyses_partielles)
+    analyses_partielles = reduce_to_budget(analyses_partielles, merge_rooms, budget, concurrency)
+    global_context = SEPARATOR.join(analyses_partielles)
     final_prompt_content = (
         f"Voici les résultats de l'analyse individuelle de chaque fichier. "
         f"Compile ou présente le résultat final conformément à tes instructions système :\n\n{global_context}"
     )
 
-    stream_final = ask_llm(chat_history=[
-        {"role": "system", "content": sys_content},
-        {"role": "user", "content": final_prompt_content}
-    ])
+    # Indices chiffrés pour la section "hypotheses", si un plan a été sauvegardé
+    propagation = propagation_evidence(layout_path, summaries)
+    if propagation:
+        final_prompt_content += (
+            "\n\nPropagation entre pièces (modèle des murs mitoyens du plan sauvegardé), "
+            "à utiliser comme indices pour les hypothèses :\n- " + "\n- ".join(evidence_lines(propagation))
+        )
 
-    full_response = ""
-    for chunk in stream_final:
-        content = chunk.choices[0].delta.content
-        if content:
-            full_response += content
-        time.sleep(0.005)
+    # JSON validé au fil du flux ; en cas d'échec, un seul petit appel de correction
+    # au lieu de relancer toute l'analyse
+    schema = schema_from_context(sys_content)
+    with metrics.timer("sonalyze_stage_seconds", stage="consolidate"):
+        try:
+            final = stream_final_json([
+                {"role": "system", "content": sys_content},
+                {"role": "user", "content": final_prompt_content}
+            ], schema, use_cache, on_event)
+        except SchemaError as e:
+            print(f"⚠️ JSON final invalide ({e}), demande de correction...")
+            on_event("stage", {"stage": "repair", "error": str(e)})
+            try:
+                final = stream_final_json([
+                    {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+                    {"role": "user", "content": repair_prompt(e.answer, e, schema)}
+                ], schema, use_cache, on_event)
+            except SchemaError:
+                metrics.inc("sonalyze_final_json_repairs_total", outcome="failed")
+                raise
+            metrics.inc("sonalyze_final_json_repairs_total", outcome="repaired")
+    full_response = json.dumps(final, ensure_ascii=False, indent=2)
 
     # -------------------------
     # 5. AFFICHAGE / SAUVEGARDE
@@ -87,5 +279,9 @@ def send_to_llm(export_path):
     print("\n=== RÉSULTAT FINAL ===\n")
     print(full_response)
 
-    with open(export_path, "w", encoding="utf-8") as f:
+    with atomic_write(export_path) as f:
         f.write(full_response)
+    metrics.inc("sonalyze_bytes_written_total", len(full_response.encode("utf-8")), stage="consolidate")
+
+    # Résumés locaux par pièce (clé = nom du fichier sans extension) et propagation, pour le rapport
+    return {"summaries": summaries, "propagation": propagation}
@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+from flask import Flask, Response, jsonify, request
+
+from scripts.config_api import MODEL, LLM_CACHE_DIR
+from scripts.final_json import load_schema
+from scripts.llm_cache import cache_key, cache_get
+
+# Local stand-in for the Groq chat completions API, for offline and load
+# tests. Start it, then point the pipeline at it:
+#
+#   python -m scripts.llm_standin --mode generate --ttft 0.8 --token-delay 0.02 --error-rate 0.1
+#   GROQ_BASE_URL=http://127.0.0.1:8008 python run.py
+#
+# Modes:
+#   replay    answers with responses recorded in the LLM cache (same key as
+#             scripts/llm_cache.py, so any run with the cache on records them)
+#   generate  deterministic answers: a text summary for single-room prompts,
+#             the JSON schema of scripts/context.txt for the consolidation
+# In both modes, latency and rate-limit errors can be injected.
+
+STANDIN_PORT = 8008
+CONTEXT_PATH = "scripts/context.txt"
+RATINGS = "ABCDEFG"
+
+_TOKEN = re.compile(r"\S+\s*|\s+")
+
+
+# -------------------------
+# Responses
+# -------------------------
+
+def _digest(messages):
+    return hashlib.sha256(json.dumps(messages, sort_keys=True, ensure_ascii=False).encode("utf-8")).digest()
+
+
+def _room_summary(prompt):
+    # Single-room prompt: "... à traiter : {json}"
+    try:
+        summary = json.loads(prompt[prompt.index("{"):])
+    except ValueError:
+        return "1. Zone analysée : inconnue.\n2. Aucune mesure exploitable."
+    levels = summary.get("niveaux", {})
+    ratings = summary.get("notes", {})
+    day_night = summary.get("jour_nuit", {})
+    labels = [(l["label"], l["occurrences"]) for l in summary.get("labels", [])[:3]]
+    worst = max(ratings, key=RATINGS.index) if ratings else "N/A"
+    lines = [
+        f"1. Zone analysée : {summary.get('fichier', 'inconnue')}.",
+        f"2. LAeq moyen {levels.get('LAeq_moyen_dB', 'N/A')} dB, pic max {levels.get('LAeq_max_dB', 'N/A')} dB.",
+        f"3. Note du segment : {worst}.",
+        f"4. Jour / nuit : {json.dumps(day_night, ensure_ascii=False)}.",
+        "5. Labels dominants : " + (", ".join(f"{name} ({count})" for name, count in labels) or "aucun") + ".",
+        "6. Anomalies : aucune anomalie simulée.",
+    ]
+    return "\n".join(lines)
+
+
+def _final_json(schema, digest):
+    result = json.loads(json.dumps(schema))
+    result["interpretation"]["note_globale"] = RATINGS[digest[0] % len(RATINGS)]
+    return json.dumps(result, ensure_ascii=False, indent=2)
+
+
+def generate_response(messages, schema):
+    user = messages[-1]["content"] if messages else ""
+    if "Compile" in user or "JSON final corrigé" in user:
+        return _final_json(schema, _digest(messages))
+    return _room_summary(user)
+
+
+# -------------------------
+# Server
+# -------------------------
+
+def _chunk(completion_id, model, content=None, finish_reason=None):
+    delta = {"role": "assistant", "content": content} if content is not None else {}
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _rate_limited(retry_after, message):
+    response = jsonify({"error": {"message": message, "type": "tokens", "code": "rate_limit_exceeded"}})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def create_app(mode="generate", recordings=LLM_CACHE_DIR, fallback=False, ttft=0.0, token_delay=0.0,
+               error_rate=0.0, max_in_flight=0, retry_after=1, seed=0, context_path=CONTEXT_PATH):
+    app = Flask(__name__)
+    schema = load_schema(context_path)
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    stats = {"requests": 0, "in_flight": 0, "max_in_flight": 0, "rate_limited": 0,
+             "replayed": 0, "generated": 0, "missing": 0}
+
+    def finish():
+        with lock:
+            stats["in_flight"] -= 1
+
+    @app.get("/stats")
+    def get_stats():
+        with lock:
+            return jsonify(stats)
+
+    @app.post("/openai/v1/chat/completions")
+    def chat_completions():
+        body = request.get_json(force=True)
+        messages = body.get("messages", [])
+        model = body.get("model", MODEL)
+
+        with lock:
+            stats["requests"] += 1
+            if error_rate and rng.random() < error_rate:
+                stats["rate_limited"] += 1
+                return _rate_limited(retry_after, "Injected rate limit")
+
+        text = None
+        if mode == "replay":
+            text = cache_get(cache_key(model, messages), recordings, max_age=float("inf"))
+            with lock:
+                stats["replayed" if text is not None else "missing"] += 1
+            if text is None and not fallback:
+                return jsonify({"error": {"message": "No recording for this prompt", "type": "not_found"}}), 404
+        if text is None:
+            text = generate_response(messages, schema)
+            with lock:
+                stats["generated"] += 1
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        with lock:
+            # Checked and taken in one go, or two requests could both see a free slot
+            if max_in_flight and stats["in_flight"] >= max_in_flight:
+                stats["rate_limited"] += 1
+                return _rate_limited(retry_after, f"More than {max_in_flight} concurrent requests")
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+
+        if not body.get("stream"):
+            try:
+                time.sleep(ttft + token_delay * len(_TOKEN.findall(text)))
+            finally:
+                finish()
+            return jsonify({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+            })
+
+        def events():
+            try:
+                time.sleep(ttft)
+                for token in _TOKEN.findall(text):
+                    yield f"data: {json.dumps(_chunk(completion_id, model, token), ensure_ascii=False)}\n\n"
+                    if token_delay:
+                        time.sleep(token_delay)
+                yield f"data: {json.dumps(_chunk(completion_id, model, finish_reason='stop'))}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                finish()
+
+        return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Groq-compatible chat completions server.")
+    parser.add_argument("--mode", choices=("generate", "replay"), default="generate")
+    parser.add_argument("--recordings", default=LLM_CACHE_DIR, help="LLM cache folder used by replay")
+    parser.add_argument("--fallback", action="store_true", help="replay: generate when nothing was recorded")
+    parser.add_argument("--ttft", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--max-in-flight", type=int, default=0, help="429 beyond this many open streams (0 = no limit)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After header of the 429s, in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the injected errors")
+    parser.add_argument("--port", type=int, default=STANDIN_PORT)
+    args = parser.parse_args(argv)
+
+    app = create_app(args.mode, args.recordings, args.fallback, args.ttft, args.token_delay,
+                     args.error_rate, args.max_in_flight, args.retry_after, args.seed)
+    print(f"LLM stand-in ({args.mode}) on http://127.0.0.1:{args.port} — set GROQ_BASE_URL to this address")
+    app.run(port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
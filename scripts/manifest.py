@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+
+MANIFEST_PATH = "exports/manifest.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"version": 1, "files": {}}
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def hash_file(path, prefix_length=None, checkpoint=None):
+    """
+    SHA-256 of the whole file and, in the same pass, of its first
+    `prefix_length` bytes (None if the file is shorter or no prefix asked).
+    `checkpoint` (a dict), when given, receives the hash state at the start
+    of the last chunk, so prefix_digest() can go on from there.
+    """
+    full = hashlib.sha256()
+    prefix_digest = None
+    read = 0
+    with open(path, "rb") as f:
+        while True:
+            if prefix_length is not None and prefix_digest is None and read == prefix_length:
+                prefix_digest = full.hexdigest()
+            size = HASH_CHUNK_SIZE
+            if prefix_length is not None and read < prefix_length:
+                size = min(size, prefix_length - read)
+            state = full.copy() if checkpoint is not None else None
+            chunk = f.read(size)
+            if not chunk:
+                break
+            if checkpoint is not None:
+                checkpoint.update(offset=read, hash=state)
+            full.update(chunk)
+            read += len(chunk)
+    return full.hexdigest(), prefix_digest
+
+
+def prefix_digest(path, length, checkpoint=None):
+    """
+    SHA-256 of the first `length` bytes. Starts from a hash_file()
+    checkpoint at or before `length` instead of from the beginning, so
+    only the bytes after it are read again.
+    """
+    if checkpoint and checkpoint["offset"] <= length:
+        digest, read = checkpoint["hash"].copy(), checkpoint["offset"]
+    else:
+        digest, read = hashlib.sha256(), 0
+    with open(path, "rb") as f:
+        f.seek(read)
+        while read < length:
+            chunk = f.read(min(HASH_CHUNK_SIZE, length - read))
+            if not chunk:
+                break
+            digest.update(chunk)
+            read += len(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
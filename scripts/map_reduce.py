@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Hierarchical reduction of LLM outputs under a prompt budget: texts are
+# packed into groups that fit, each group is merged by one call, and the
+# merged texts are packed again until everything fits in one prompt.
+
+SEPARATOR = "\n"
+
+
+def joined_length(texts):
+    return sum(len(t) for t in texts) + len(SEPARATOR) * max(len(texts) - 1, 0)
+
+
+def pack(texts, budget):
+    """Consecutive groups of texts whose joined length stays within `budget`."""
+    groups, current = [], []
+    for text in texts:
+        if current and joined_length(current + [text]) > budget:
+            groups.append(current)
+            current = []
+        current.append(text)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def reduce_to_budget(texts, merge, budget, concurrency=1):
+    """
+    Merge `texts` (order kept) until their joined length fits `budget`.
+    `merge(group)` returns one text for a list of texts; the groups of a
+    level are merged in parallel.
+    """
+    texts = list(texts)
+    while len(texts) > 1 and joined_length(texts) > budget:
+        groups = pack(texts, budget)
+        if len(groups) == len(texts):
+            # Every text is over half the budget: merge pairs so each level still shrinks
+            groups = [texts[i:i + 2] for i in range(0, len(texts), 2)]
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            texts = list(executor.map(merge, groups))
+    return texts
@@ -0,0 +1,121 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process metrics, rendered in the Prometheus text format by /metrics.
+# Every metric is declared here; labels are free.
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRICS = {
+    "sonalyze_stage_seconds": ("histogram", "Duration of each pipeline stage.", TIME_BUCKETS),
+    "sonalyze_records_parsed_total": ("counter", "Raw measurements read by the parser.", None),
+    "sonalyze_parse_files_total": ("counter", "Room files seen by the parser, by outcome.", None),
+    "sonalyze_bytes_read_total": ("counter", "Bytes read, by stage.", None),
+    "sonalyze_bytes_written_total": ("counter", "Bytes written, by stage.", None),
+    "sonalyze_llm_requests_total": ("counter", "LLM calls, by source (live or cache).", None),
+    "sonalyze_llm_ttft_seconds": ("histogram", "Time from the LLM call to its first token.", TIME_BUCKETS),
+    "sonalyze_llm_stream_seconds": ("histogram", "Time from the LLM call to the end of its stream.", TIME_BUCKETS),
+    "sonalyze_llm_prompt_chars": ("histogram", "Characters sent to the LLM per call.", SIZE_BUCKETS),
+    "sonalyze_llm_completion_chars": ("histogram", "Characters received from the LLM per call.", SIZE_BUCKETS),
+    "sonalyze_llm_retries_total": ("counter", "LLM calls retried, by reason.", None),
+    "sonalyze_llm_throttle_seconds": ("histogram", "Time an LLM call waited for the rate limiter.", TIME_BUCKETS),
+    "sonalyze_final_json_repairs_total": ("counter", "Final answers that needed a repair call, by outcome.", None),
+    "sonalyze_llm_cache_total": ("counter", "LLM cache lookups, by result.", None),
+    "sonalyze_pdf_render_seconds": ("histogram", "Time to build the PDF report.", TIME_BUCKETS),
+}
+
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+
+
+def _key(name, labels):
+    if name not in METRICS:
+        raise KeyError(f"Unknown metric: {name}")
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    buckets = METRICS[name][2]
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def counted(iterable, name, **labels):
+    """Pass the items through and add how many there were to the counter `name`."""
+    count = 0
+    try:
+        for item in iterable:
+            count += 1
+            yield item
+    finally:
+        inc(name, count, **labels)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: {"buckets": list(h["buckets"]), "sum": h["sum"], "count": h["count"]}
+                      for k, h in _histograms.items()}
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            continue
+        for (metric, labels), hist in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(buckets, hist["buckets"]):
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(hist['sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
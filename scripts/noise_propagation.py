@@ -0,0 +1,175 @@
+import networkx as nx
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+# Noise transfer between the rooms of a saved layout. Rooms are rectangles;
+# two rooms are neighbours when they share a wall. Each room gets, in energy
+# terms:
+#
+#     E_i = s_i + sum_j T_ij E_j      T_ij = tau * wall_ij / perimeter_i
+#
+# where s_i is the noise made in the room itself and tau = 10^(-R/10) the
+# transmission of a wall of sound reduction index R. Measured rooms fix E;
+# unmeasured rooms are assumed to make only background noise, and their
+# level is solved for. The sources then follow from s = (I - T) E, and the
+# part of every measured level coming from every room from (I - T)^-1 s.
+
+WALL_REDUCTION_DB = 35     # R of an ordinary interior partition
+BACKGROUND_DB = 25         # own noise assumed for the rooms without measurements
+WALL_TOLERANCE = 5.0       # layout units: edges closer than this are the same wall
+MIN_SHARED_WALL = 5.0      # layout units of overlap to count as a shared wall
+CONTRIBUTORS = 3           # other rooms listed per measured room
+MIN_EVIDENCE_SHARE = 0.05  # smaller transferred shares are not reported
+
+
+def _touching(low_side, high_side, span_start, span_stop, tolerance, min_overlap):
+    """
+    (i, j, overlap) for every pair where the high edge of room i lies on
+    the low edge of room j and their spans overlap. Sorted search, no n².
+    """
+    order = np.argsort(low_side, kind="stable")
+    sorted_low = low_side[order]
+    lo = np.searchsorted(sorted_low, high_side - tolerance, side="left")
+    hi = np.searchsorted(sorted_low, high_side + tolerance, side="right")
+    counts = hi - lo
+    i = np.repeat(np.arange(high_side.size), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    j = order[np.repeat(lo, counts) + offsets]
+    overlap = np.minimum(span_stop[i], span_stop[j]) - np.maximum(span_start[i], span_start[j])
+    keep = (overlap >= min_overlap) & (i != j)
+    return i[keep], j[keep], overlap[keep]
+
+
+def shared_walls(rooms, tolerance=WALL_TOLERANCE, min_overlap=MIN_SHARED_WALL):
+    """(i, j, length) arrays of the walls shared by rooms i and j (i on the left of / above j)."""
+    x = np.array([r["x"] for r in rooms], dtype=np.float64)
+    y = np.array([r["y"] for r in rooms], dtype=np.float64)
+    w = np.array([r["width"] for r in rooms], dtype=np.float64)
+    h = np.array([r["height"] for r in rooms], dtype=np.float64)
+    vertical = _touching(x, x + w, y, y + h, tolerance, min_overlap)
+    horizontal = _touching(y, y + h, x, x + w, tolerance, min_overlap)
+    return tuple(np.concatenate(parts) for parts in zip(vertical, horizontal))
+
+
+def room_graph(rooms, levels):
+    """networkx graph of the layout: rooms with their measured LAeq (or None), shared walls with their length."""
+    graph = nx.Graph()
+    for index, room in enumerate(rooms):
+        graph.add_node(index, name=room["name"], laeq=levels.get(room["name"]),
+                       perimeter=2 * (room["width"] + room["height"]))
+    i, j, length = shared_walls(rooms)
+    graph.add_weighted_edges_from(zip(i.tolist(), j.tolist(), length.tolist()), weight="wall")
+    return graph
+
+
+def transfer_matrix(graph, wall_reduction_db=WALL_REDUCTION_DB):
+    """Sparse T (CSR): T_ij, share of the energy of room j that reaches room i."""
+    nodes = list(graph.nodes)
+    walls = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight="wall", format="csr")
+    perimeter = np.array([graph.nodes[n]["perimeter"] for n in nodes], dtype=np.float64)
+    tau = 10 ** (-wall_reduction_db / 10)
+    return sparse.diags(tau / np.maximum(perimeter, 1e-9)) @ walls
+
+
+def _db(energy):
+    with np.errstate(divide="ignore"):
+        return np.round(10 * np.log10(energy), 1)
+
+
+def propagate(rooms, levels, wall_reduction_db=WALL_REDUCTION_DB, background_db=BACKGROUND_DB):
+    """
+    Levels, own sources and transferred shares of every room of the layout.
+    `levels` maps room names to their measured LAeq (dB). Returns
+    {"rooms": [...], "walls": n, "sources": [...]}, the sources being the
+    rooms ranked by the energy they send into the measured rooms.
+    """
+    graph = room_graph(rooms, levels)
+    n = len(rooms)
+    T = transfer_matrix(graph, wall_reduction_db)
+    A = (sparse.identity(n, format="csc") - T).tocsc()
+
+    laeq = np.array([np.nan if levels.get(r["name"]) is None else levels[r["name"]] for r in rooms])
+    measured = np.isfinite(laeq)
+    energy = np.where(measured, np.power(10.0, np.nan_to_num(laeq) / 10), 0.0)
+
+    # Unmeasured rooms: (I - T_uu) E_u = s_bg + T_um E_m
+    unknown = np.flatnonzero(~measured)
+    if unknown.size:
+        A_uu = A[unknown][:, unknown].tocsc()
+        rhs = np.full(unknown.size, 10 ** (background_db / 10)) + T[unknown] @ energy
+        energy[unknown] = splu(A_uu).solve(rhs)
+
+    # A measured level below what the neighbours send gives a negative source: no own noise
+    sources = np.maximum(A @ energy, 0.0)
+
+    # Energy of each measured room coming from each room k: row of (I - T)^-1 times s_k.
+    # (I - T)^-1 = I + T + T² + ...; a wall lets through at most tau of the energy,
+    # so what crosses three walls or more (< tau³) is left out and the result stays sparse
+    known = np.flatnonzero(measured)
+    reach = (sparse.identity(n, format="csr") + T + T @ T).tocsr()
+    origin = (reach[known] @ sparse.diags(sources)).tocoo()
+    rows, cols, values = origin.row, origin.col, origin.data
+    total = np.bincount(rows, weights=values, minlength=known.size)
+    share = values / np.maximum(total[rows], 1e-30)
+    own = cols == known[rows]
+    own_share = np.zeros(known.size)
+    own_share[rows[own]] = share[own]
+
+    # Contributions of the other rooms, largest first within each measured room
+    others = np.flatnonzero(~own & (share >= 0.0005))
+    others = others[np.lexsort((-share[others], rows[others]))]
+    contributions = {}
+    for k in others:
+        listed = contributions.setdefault(int(rows[k]), [])
+        if len(listed) < CONTRIBUTORS:
+            listed.append({"room": rooms[cols[k]]["name"], "part": round(float(share[k]), 3)})
+
+    result_rooms = []
+    position = {int(room): p for p, room in enumerate(known)}
+    for index, room in enumerate(rooms):
+        entry = {
+            "room": room["name"],
+            "neighbours": [graph.nodes[j]["name"] for j in graph.neighbors(index)],
+            "LAeq_mesure_dB": None if not measured[index] else float(laeq[index]),
+            "LAeq_estime_dB": float(_db(energy[index])),
+            "source_propre_dB": float(_db(sources[index])) if sources[index] > 0 else None,
+        }
+        if measured[index]:
+            p = position[index]
+            entry["part_transmise"] = round(float(1 - own_share[p]), 3)
+            entry["contributions"] = contributions.get(p, [])
+        result_rooms.append(entry)
+
+    # Sources: rooms making a noticeable part of another measured room's level,
+    # ranked by the energy they send into the measured rooms other than themselves
+    noticed = ~own & (share >= MIN_EVIDENCE_SHARE)
+    sent = np.bincount(cols[noticed], weights=values[noticed], minlength=n)
+    ranked = [k for k in np.argsort(-sent, kind="stable") if sent[k] > 0][:CONTRIBUTORS]
+    return {
+        "rooms": result_rooms,
+        "walls": graph.number_of_edges(),
+        "sources": [{"room": rooms[k]["name"], "source_propre_dB": float(_db(sources[k]))} for k in ranked],
+    }
+
+
+def evidence_lines(result, min_share=MIN_EVIDENCE_SHARE):
+    """Short French sentences for the hypotheses of the report."""
+    lines = []
+    for room in result["rooms"]:
+        if room["LAeq_mesure_dB"] is None:
+            continue
+        if not room["neighbours"]:
+            lines.append(f"{room['room']} : aucun mur mitoyen dans le plan, bruit d'origine locale ou extérieure.")
+            continue
+        transferred = [c for c in room.get("contributions", []) if c["part"] >= min_share]
+        if transferred:
+            parts = ", ".join(f"{c['room']} ({round(c['part'] * 100)} %)" for c in transferred)
+            lines.append(f"{room['room']} ({room['LAeq_mesure_dB']} dB) : une part notable viendrait des pièces voisines : {parts}.")
+        else:
+            lines.append(f"{room['room']} ({room['LAeq_mesure_dB']} dB) : le bruit est surtout produit dans la pièce "
+                         f"(moins de {round(min_share * 100)} % transmis par les murs mitoyens).")
+    if result["sources"]:
+        lines.append("Sources probables pour les pièces voisines : "
+                     + ", ".join(f"{s['room']} ({s['source_propre_dB']} dB)" for s in result["sources"]) + ".")
+    return lines
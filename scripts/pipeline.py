@@ -0,0 +1,73 @@
+import os
+
+from scripts import metrics
+from scripts.file_utils import atomic_copy, atomic_write
+from scripts.workspace import ensure_workspace, new_run, prune_runs, workspace_lock
+
+# The stage modules (numpy, groq, matplotlib, reportlab) are imported when
+# their stage first runs, so importing this module — and the web app — stays cheap.
+
+
+def _no_event(event, data):
+    pass
+
+
+def _floorplan(layout_path, summaries):
+    # Noise map of the saved layout, if the user saved one
+    if not os.path.exists(layout_path):
+        return None
+    from scripts.floor_plan_gen import layout_rooms, render_floorplan
+    from scripts.json_to_pdf import load_json
+    rooms = layout_rooms(load_json(layout_path))
+    if not rooms:
+        return None
+    noise_levels = {
+        name: summary["niveaux"]["LAeq_moyen_dB"]
+        for name, summary in summaries.items() if "niveaux" in summary
+    }
+    return render_floorplan(rooms, noise_levels)
+
+
+def run_pipeline(workspace_root=".", run_id=None, use_cache=True, on_event=_no_event):
+    with metrics.timer("sonalyze_stage_seconds", stage="total"):
+        return _run_pipeline(workspace_root, run_id, use_cache, on_event)
+
+
+def _run_pipeline(workspace_root, run_id, use_cache, on_event):
+    paths = ensure_workspace(workspace_root)
+    run = new_run(workspace_root, run_id)
+
+    # Run in order — EACH one waits for the previous one to finish.
+    # Parse outputs are shared by the workspace's runs; the LLM result and
+    # the PDF are private to this run, so runs can overlap safely.
+    on_event("stage", {"stage": "parse"})
+    from scripts.json_parser import process_and_sample_folder
+    with metrics.timer("sonalyze_stage_seconds", stage="parse"), workspace_lock(workspace_root):
+        parse_summary = process_and_sample_folder(
+            paths["rooms"], paths["parsed"], paths["columnar"], paths["manifest"]
+        )
+    on_event("stage", {"stage": "analyse", "rooms": parse_summary["processed_files"]})
+    from scripts.llm_intermidiary import send_to_llm
+    analysis = send_to_llm(export_path=run["llm_result"], use_cache=use_cache,
+                parsed_folder=paths["parsed"], columnar_folder=paths["columnar"],
+                layout_path=paths["layout"], on_event=on_event)
+    on_event("stage", {"stage": "pdf"})
+    from scripts.json_to_pdf import load_json, render_pdf_bytes
+    with metrics.timer("sonalyze_stage_seconds", stage="pdf"):
+        floorplan_png = _floorplan(paths["layout"], analysis["summaries"])
+        pdf_bytes = render_pdf_bytes(load_json(run["llm_result"]), floorplan_png)
+        with atomic_write(run["pdf"], "wb") as f:
+            f.write(pdf_bytes)
+
+    # Publish as the workspace's latest result
+    atomic_copy(run["llm_result"], paths["llm_result"])
+    atomic_copy(run["pdf"], paths["pdf"])
+    prune_runs(workspace_root)
+
+    return {
+        "run_id": run["id"],
+        "processed_files": parse_summary["processed_files"],
+        "llm_result_path": run["llm_result"],
+        "pdf_path": run["pdf"],
+        "_pdf": pdf_bytes,  # kept in memory by the job queue, not serialised
+    }
@@ -0,0 +1,69 @@
+import numpy as np
+
+# Exceedance levels computed per bucket: L10 = level exceeded 10% of the time
+EXCEEDANCE_LEVELS = (10, 50, 90)
+
+
+def parse_timestamps(values):
+    """'YYYY-MM-DD HH:MM:SS' strings -> int64 epoch seconds, in one NumPy call."""
+    return np.asarray(values, dtype="datetime64[s]").astype(np.int64)
+
+
+def format_timestamps(epochs):
+    return np.char.replace(np.datetime_as_string(np.asarray(epochs).astype("datetime64[s]")), "T", " ")
+
+
+def _group_percentile(sorted_values, starts, counts, q):
+    # Same linear interpolation as np.percentile, for every group at once
+    pos = (counts - 1) * q
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    v_lo = sorted_values[starts + lo]
+    v_hi = sorted_values[starts + hi]
+    return v_lo + (v_hi - v_lo) * (pos - lo)
+
+
+def resample(timestamps, laeq, labels=None, n_labels=0, bucket_seconds=120,
+             exceedance=EXCEEDANCE_LEVELS):
+    """
+    Aggregate measurements into fixed time buckets aligned on the epoch.
+
+    `timestamps` are int64 epoch seconds, `laeq` the levels (NaN ignored),
+    `labels` an optional (n, k) matrix of label codes (< 0 = empty slot)
+    over a vocabulary of `n_labels`. Returns a dict of per-bucket arrays:
+    start, count, energy_sum, laeq (energetic mean), max, L<n> for each
+    exceedance level, bucket (bucket index of every input record, -1 if
+    dropped) and label_counts (buckets x n_labels) when labels are given.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    laeq = np.asarray(laeq, dtype=np.float64)
+    valid = np.isfinite(laeq)
+    buckets = timestamps // bucket_seconds
+
+    order = np.lexsort((laeq[valid], buckets[valid]))
+    b_sorted = buckets[valid][order]
+    v_sorted = laeq[valid][order]
+    uniq, starts, counts = np.unique(b_sorted, return_index=True, return_counts=True)
+
+    energy_sum = np.add.reduceat(np.power(10.0, v_sorted / 10), starts) if uniq.size else np.empty(0)
+    result = {
+        "start": uniq * bucket_seconds,
+        "count": counts,
+        "energy_sum": energy_sum,
+        "laeq": 10 * np.log10(energy_sum / counts) if uniq.size else np.empty(0),
+        "max": v_sorted[starts + counts - 1],
+    }
+    for level in exceedance:
+        result[f"L{level}"] = _group_percentile(v_sorted, starts, counts, 1 - level / 100)
+
+    record_bucket = np.full(timestamps.size, -1, dtype=np.int64)
+    record_bucket[valid] = np.searchsorted(uniq, buckets[valid])
+    result["bucket"] = record_bucket
+
+    if labels is not None:
+        labels = np.asarray(labels).reshape(timestamps.size, -1)
+        slot_bucket = np.repeat(record_bucket, labels.shape[1]).reshape(labels.shape)
+        keep = (labels >= 0) & (slot_bucket >= 0)
+        flat = slot_bucket[keep] * n_labels + labels[keep]
+        result["label_counts"] = np.bincount(flat, minlength=uniq.size * n_labels).reshape(uniq.size, n_labels)
+    return result
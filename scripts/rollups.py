@@ -0,0 +1,226 @@
+import os
+import threading
+
+import numpy as np
+
+# Pre-aggregated levels of a room store, so any time range is answered from
+# a handful of rows instead of the whole recording. One structured .npy per
+# resolution, next to the columns (written in the same temp dir, so both are
+# swapped in together). Each row holds the energy sum, sample count, max and
+# a histogram of the levels of one aligned bucket.
+
+ROLLUP_SECONDS = (900, 3600, 86400)  # 15 min, 1 h, 1 day; each divides the next
+HISTOGRAM_START = 20.0  # dB; bin 0 is everything below, the last bin everything above
+HISTOGRAM_STEP = 5.0
+HISTOGRAM_BINS = 22
+EXCEEDANCE_LEVELS = (10, 50, 90)
+
+ROLLUP_DTYPE = np.dtype([
+    ("start", np.int64),
+    ("count", np.uint32),
+    ("energy", np.float64),
+    ("max", np.float32),
+    ("hist", np.uint32, (HISTOGRAM_BINS,)),
+])
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def rollup_path(room_dir, seconds):
+    return os.path.join(room_dir, f"rollup-{seconds}s.npy")
+
+
+def histogram_bin(laeq):
+    bins = np.floor((np.asarray(laeq, dtype=np.float64) - HISTOGRAM_START) / HISTOGRAM_STEP) + 1
+    return np.clip(bins, 0, HISTOGRAM_BINS - 1).astype(np.int64)
+
+
+def histogram_edges():
+    return [HISTOGRAM_START + HISTOGRAM_STEP * i for i in range(HISTOGRAM_BINS - 1)]
+
+
+def _group(starts, rows):
+    # rows (sorted by start) -> one row per distinct start
+    uniq, first = np.unique(starts, return_index=True)
+    out = np.zeros(uniq.size, dtype=ROLLUP_DTYPE)
+    out["start"] = uniq
+    if uniq.size:
+        out["count"] = np.add.reduceat(rows["count"], first)
+        out["energy"] = np.add.reduceat(rows["energy"], first)
+        out["max"] = np.fmax.reduceat(rows["max"], first)
+        out["hist"] = np.add.reduceat(rows["hist"], first, axis=0)
+    return out
+
+
+def build_rollups(timestamp, laeq, laeq_max, seconds=ROLLUP_SECONDS):
+    """{bucket seconds: rows} from the store columns (NaN levels ignored)."""
+    timestamp = np.asarray(timestamp, dtype=np.int64)
+    laeq = np.asarray(laeq, dtype=np.float64)
+    laeq_max = np.asarray(laeq_max, dtype=np.float64)
+    valid = np.isfinite(laeq)
+    timestamp, laeq, laeq_max = timestamp[valid], laeq[valid], laeq_max[valid]
+    order = np.argsort(timestamp, kind="stable")
+
+    samples = np.zeros(timestamp.size, dtype=ROLLUP_DTYPE)
+    samples["start"] = timestamp[order]
+    samples["count"] = 1
+    samples["energy"] = np.power(10.0, laeq[order] / 10)
+    samples["max"] = np.where(np.isfinite(laeq_max), laeq_max, laeq)[order]
+    samples["hist"][np.arange(timestamp.size), histogram_bin(laeq[order])] = 1
+
+    rollups = {}
+    rows = samples
+    for size in seconds:
+        # Each level is built from the previous one, not from the samples
+        rows = _group(rows["start"] // size * size, rows)
+        rollups[size] = rows
+    return rollups
+
+
+def save_rollups(room_dir, timestamp, laeq, laeq_max):
+    for size, rows in build_rollups(timestamp, laeq, laeq_max).items():
+        np.save(rollup_path(room_dir, size), rows)
+
+
+def _signature(room_dir):
+    st = os.stat(os.path.join(room_dir, "meta.json"))
+    return st.st_ino, st.st_mtime_ns
+
+
+def open_rollups(room_dir):
+    """
+    The room's columns and rollups, memory-mapped and kept open until the
+    store is rewritten. Stores written before rollups existed get them
+    built in memory.
+    """
+    from scripts.columnar_store import open_room_columns, store_lock  # imports this module
+
+    # Columns and rollups of the same version: no swap while they are opened
+    with store_lock(room_dir).shared():
+        signature = _signature(room_dir)
+        with _cache_lock:
+            cached = _cache.get(room_dir)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        columns = open_room_columns(room_dir)
+        try:
+            rollups = {size: np.load(rollup_path(room_dir, size), mmap_mode="r") for size in ROLLUP_SECONDS}
+        except FileNotFoundError:
+            rollups = None
+    if rollups is None:
+        rollups = build_rollups(columns["timestamp"], columns["laeq"], columns["laeq_max"])
+    store = {"columns": columns, "rollups": rollups}
+    with _cache_lock:
+        _cache[room_dir] = (signature, store)
+    return store
+
+
+# -------------------------
+# Queries
+# -------------------------
+
+def plan_range(start, stop, seconds=ROLLUP_SECONDS):
+    """
+    Split [start, stop) into (bucket seconds, start, stop) pieces: whole
+    buckets of the coarsest level that fits in the middle, finer levels
+    towards the edges, and None (raw samples) for what is left.
+    """
+    if start >= stop:
+        return []
+    sizes = sorted(seconds, reverse=True)
+    for i, size in enumerate(sizes):
+        first = -(-start // size) * size
+        last = stop // size * size
+        if first < last:
+            finer = sizes[i + 1:]
+            return plan_range(start, first, finer) + [(size, first, last)] + plan_range(last, stop, finer)
+    return [(None, start, stop)]
+
+
+def _add(total, count, energy, peak, hist):
+    total["count"] += int(count)
+    total["energy"] += float(energy)
+    if np.isfinite(peak):
+        total["max"] = max(total["max"], float(peak))
+    total["hist"] += hist
+
+
+def accumulate(store, start, stop, total):
+    """Adds the samples of [start, stop) to `total`; returns the pieces used."""
+    pieces = plan_range(start, stop, list(store["rollups"]))
+    for size, a, b in pieces:
+        if size is None:
+            ts = store["columns"]["timestamp"]
+            i, j = np.searchsorted(ts, a), np.searchsorted(ts, b)
+            laeq = np.asarray(store["columns"]["laeq"][i:j], dtype=np.float64)
+            peak = np.asarray(store["columns"]["laeq_max"][i:j], dtype=np.float64)
+            valid = np.isfinite(laeq)
+            laeq, peak = laeq[valid], np.where(np.isfinite(peak[valid]), peak[valid], laeq)
+            hist = np.bincount(histogram_bin(laeq), minlength=HISTOGRAM_BINS)
+            _add(total, laeq.size, np.power(10.0, laeq / 10).sum(), peak.max() if peak.size else np.nan, hist)
+        else:
+            rows = store["rollups"][size]
+            i, j = np.searchsorted(rows["start"], a), np.searchsorted(rows["start"], b)
+            if i == j:
+                continue
+            rows = rows[i:j]
+            _add(total, rows["count"].sum(), rows["energy"].sum(), np.nanmax(rows["max"]), rows["hist"].sum(axis=0, dtype=np.int64))
+    return pieces
+
+
+def _histogram_percentile(hist, q):
+    # Level exceeded q% of the time, interpolated inside its histogram bin
+    target = hist.sum() * (1 - q / 100)
+    cumulative = np.cumsum(hist)
+    b = int(np.searchsorted(cumulative, target))
+    below = cumulative[b - 1] if b else 0
+    low = HISTOGRAM_START + HISTOGRAM_STEP * (b - 1)
+    return low + HISTOGRAM_STEP * (target - below) / max(hist[b], 1)
+
+
+def new_total():
+    return {"count": 0, "energy": 0.0, "max": float("-inf"), "hist": np.zeros(HISTOGRAM_BINS, dtype=np.int64)}
+
+
+def describe(total):
+    result = {"mesures": total["count"]}
+    if not total["count"]:
+        return result
+    hist = total["hist"]
+    result["LAeq_dB"] = round(float(10 * np.log10(total["energy"] / total["count"])), 1)
+    result["LAeq_max_dB"] = round(total["max"], 1) if np.isfinite(total["max"]) else None
+    for level in EXCEEDANCE_LEVELS:
+        result[f"L{level}_dB"] = round(float(_histogram_percentile(hist, level)), 1)
+    result["histogramme"] = {"bornes_dB": histogram_edges(), "mesures": hist.tolist()}
+    return result
+
+
+def daily_windows(start, stop, from_seconds, to_seconds):
+    """
+    [start, stop) cut to the same time of day every day, e.g. 22:00-06:00.
+    A window that wraps past midnight belongs to the day it starts on.
+    """
+    day = 86400
+    length = (to_seconds - from_seconds) % day or day
+    windows = []
+    first_day = start // day * day - day
+    for midnight in range(first_day, stop, day):
+        a = max(start, midnight + from_seconds)
+        b = min(stop, midnight + from_seconds + length)
+        if a < b:
+            windows.append((a, b))
+    return windows
+
+
+def query_range(room_dir, windows):
+    """Stats of a room over the (start, stop) epoch windows, plus how many pieces of each level were read."""
+    store = open_rollups(room_dir)
+    total = new_total()
+    used = {}
+    for start, stop in windows:
+        for size, _, _ in accumulate(store, start, stop, total):
+            key = "mesures" if size is None else f"{size}s"
+            used[key] = used.get(key, 0) + 1
+    return describe(total), used
@@ -0,0 +1,178 @@
+import numpy as np
+
+from scripts.columnar_store import decode_labels, decode_ratings
+
+# Plages réglementaires françaises : jour 7h-22h, nuit 22h-7h
+DAY_START_HOUR = 7
+NIGHT_START_HOUR = 22
+PEAK_COUNT = 5
+TOP_LABELS = 10
+
+
+def energetic_mean(levels):
+    """Energy average of dB levels (10·log10 of the mean of 10^(L/10))."""
+    levels = np.asarray(levels, dtype=np.float64)
+    if levels.size == 0:
+        return None
+    return float(10 * np.log10(np.mean(np.power(10.0, levels / 10))))
+
+
+def _round(value, digits=1):
+    return None if value is None else round(float(value), digits)
+
+
+def records_to_arrays(records):
+    """Split sampled records into NumPy columns (invalid levels dropped)."""
+    laeq = np.array([r.get("LAeq_segment_dB") for r in records], dtype=np.float64)
+    valid = np.isfinite(laeq)
+    kept = [r for r, ok in zip(records, valid) if ok]
+
+    timestamps = None
+    if kept and all(r.get("timestamp") for r in kept):
+        timestamps = np.array([r["timestamp"] for r in kept], dtype="datetime64[s]").astype(np.int64)
+
+    labels = np.array(
+        [(list(r.get("top_5_labels") or []) + [""] * 5)[:5] for r in kept], dtype=object
+    ).reshape(-1, 5)
+    ratings = np.array([r.get("LAeq_rating") or "" for r in kept], dtype=object)
+    laeq_max = np.array([r.get("LAeq_max_dB", r["LAeq_segment_dB"]) for r in kept], dtype=np.float64)
+    return timestamps, laeq[valid], ratings, labels, laeq_max
+
+
+def _label_frequencies(labels, total, limit=TOP_LABELS):
+    flat = labels[labels != ""]
+    if flat.size == 0:
+        return []
+    names, counts = np.unique(flat.astype(str), return_counts=True)
+    order = np.argsort(-counts, kind="stable")[:limit]
+    return [
+        {"label": str(names[i]), "occurrences": int(counts[i]), "part_mesures": _round(counts[i] / total, 3)}
+        for i in order
+    ]
+
+
+def _period_stats(laeq, laeq_max, labels):
+    if laeq.size == 0:
+        return None
+    return {
+        "mesures": int(laeq.size),
+        "LAeq_moyen_dB": _round(energetic_mean(laeq)),
+        "LAeq_max_dB": _round(laeq_max.max()),
+        "labels_dominants": [f["label"] for f in _label_frequencies(labels, laeq.size, limit=3)],
+    }
+
+
+def summarize_arrays(timestamps, laeq, ratings, labels, laeq_max=None, name=None):
+    """
+    Compact statistical summary of one room, independent of the recording
+    length. `laeq` holds the per-bucket energetic means, `laeq_max` the
+    per-bucket maxima (defaults to `laeq`).
+    """
+    laeq_max = laeq if laeq_max is None else laeq_max
+    summary = {"fichier": name, "mesures": int(laeq.size)}
+    if laeq.size == 0:
+        return summary
+
+    l10, l50, l90 = np.percentile(laeq, [90, 50, 10])
+    summary["niveaux"] = {
+        "LAeq_moyen_dB": _round(energetic_mean(laeq)),
+        "LAeq_min_dB": _round(laeq.min()),
+        "LAeq_max_dB": _round(laeq_max.max()),
+        "L10_dB": _round(l10),
+        "L50_dB": _round(l50),
+        "L90_dB": _round(l90),
+    }
+
+    rating_names, rating_counts = np.unique(ratings.astype(str), return_counts=True)
+    summary["notes"] = {str(n): int(c) for n, c in zip(rating_names, rating_counts) if n}
+
+    # Pics : les PEAK_COUNT mesures les plus fortes, du plus fort au plus faible
+    top = np.argsort(-laeq_max, kind="stable")[:PEAK_COUNT]
+    summary["pics"] = [
+        {
+            "timestamp": None if timestamps is None else str(timestamps[i].astype("datetime64[s]")).replace("T", " "),
+            "LAeq_dB": _round(laeq_max[i]),
+            "labels": [l for l in labels[i] if l],
+        }
+        for i in top
+    ]
+
+    if timestamps is not None:
+        summary["periode"] = {
+            "debut": str(timestamps.min().astype("datetime64[s]")).replace("T", " "),
+            "fin": str(timestamps.max().astype("datetime64[s]")).replace("T", " "),
+        }
+
+        hours = (timestamps // 3600) % 24
+        energy = np.power(10.0, laeq / 10)
+        counts = np.bincount(hours, minlength=24)
+        energy_sum = np.bincount(hours, weights=energy, minlength=24)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hourly = 10 * np.log10(energy_sum / counts)
+        summary["profil_horaire_dB"] = {
+            f"{h:02d}h": _round(hourly[h]) for h in range(24) if counts[h]
+        }
+
+        is_day = (hours >= DAY_START_HOUR) & (hours < NIGHT_START_HOUR)
+        summary["jour_nuit"] = {
+            "jour": _period_stats(laeq[is_day], laeq_max[is_day], labels[is_day]),
+            "nuit": _period_stats(laeq[~is_day], laeq_max[~is_day], labels[~is_day]),
+        }
+
+    summary["labels"] = _label_frequencies(labels, laeq.size)
+    return summary
+
+
+def summarize_records(records, name=None):
+    timestamps, laeq, ratings, labels, laeq_max = records_to_arrays(records)
+    return summarize_arrays(timestamps, laeq, ratings, labels, laeq_max, name=name)
+
+
+def columns_to_arrays(columns):
+    """Same arrays as records_to_arrays, from a memory-mapped columnar store."""
+    # float32 on disk; boxes report 2 decimals, so rounding restores the exact values
+    laeq = np.round(np.asarray(columns["laeq"], dtype=np.float64), 2)
+    laeq_max = np.round(np.asarray(columns["laeq_max"], dtype=np.float64), 2)
+    valid = np.isfinite(laeq)
+    return (
+        np.asarray(columns["timestamp"])[valid],
+        laeq[valid],
+        decode_ratings(columns)[valid],
+        decode_labels(columns)[valid],
+        laeq_max[valid],
+    )
+
+
+def summarize_columns(columns, name=None):
+    """Same summary, straight from a memory-mapped columnar store."""
+    return summarize_arrays(*columns_to_arrays(columns), name=name)
+
+
+def _day(ts):
+    return str(np.int64(ts).astype("datetime64[s]").astype("datetime64[D]"))
+
+
+def day_night_windows(timestamps):
+    """
+    Split a time-sorted series into its successive day (7h-22h) and night
+    (22h-7h) periods. Returns (label, start, stop) index ranges; a night
+    is labelled with both dates it spans.
+    """
+    if timestamps is None or len(timestamps) == 0:
+        return []
+    # Shift so that each "period day" starts at 7h: [0, 15h) is day, [15h, 24h) is night
+    shifted = np.asarray(timestamps, dtype=np.int64) - DAY_START_HOUR * 3600
+    day_index = shifted // 86400
+    is_night = (shifted % 86400) >= (NIGHT_START_HOUR - DAY_START_HOUR) * 3600
+    key = day_index * 2 + is_night
+    bounds = np.concatenate(([0], np.flatnonzero(np.diff(key)) + 1, [len(key)]))
+
+    windows = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        first_day = _day(day_index[start] * 86400)
+        if is_night[start]:
+            label = f"nuit du {first_day} au {_day((day_index[start] + 1) * 86400)}"
+        else:
+            label = f"jour du {first_day}"
+        windows.append((label, int(start), int(stop)))
+    return windows
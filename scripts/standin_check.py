@@ -0,0 +1,72 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from werkzeug.serving import make_server
+
+from scripts.json_example_creator import generate_random_records
+from scripts.llm_standin import create_app
+
+# Smoke test of the stand-in: runs the whole pipeline against it, in a fresh
+# interpreter pointed at the stand-in and a throwaway workspace. Exits with 1
+# when the pipeline fails or the final JSON is missing. The provider limits
+# are off (rpm/tpm = 0) unless given.
+#
+#   python -m scripts.standin_check [rooms] [days]
+
+START_TIME = datetime(2025, 12, 5, 0, 0, 0)
+INTERVAL = timedelta(minutes=2)
+
+_PROBE = """
+import json
+from scripts.pipeline import run_pipeline
+result = run_pipeline(workspace_root={root!r}, use_cache=False)
+print(json.dumps({{"llm_result_path": result["llm_result_path"], "pdf_path": result["pdf_path"]}}))
+"""
+
+
+def run_check(rooms=2, days=1, mode="generate", rpm=0, tpm=0):
+    app = create_app(mode)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            rooms_dir = os.path.join(root, "data", "rooms")
+            os.makedirs(rooms_dir)
+            for i in range(rooms):
+                generate_random_records(os.path.join(rooms_dir, f"room{i + 1}.json"), START_TIME,
+                                        days * 24 * 60 // 2, INTERVAL)
+            env = dict(os.environ, GROQ_BASE_URL=f"http://127.0.0.1:{server.server_port}",
+                       LLM_CACHE_DIR=os.path.join(root, "llm_cache"), LLM_RPM=str(rpm), LLM_TPM=str(tpm))
+            proc = subprocess.run([sys.executable, "-c", _PROBE.format(root=root)],
+                                  capture_output=True, text=True, env=env)
+            if proc.returncode != 0:
+                return {"ok": False, "error": proc.stderr.strip().splitlines()[-1:] or ["exit " + str(proc.returncode)]}
+            paths = json.loads(proc.stdout.strip().splitlines()[-1])
+            with open(paths["llm_result_path"], "r", encoding="utf-8") as f:
+                final = json.load(f)
+            return {"ok": "interpretation" in final and os.path.getsize(paths["pdf_path"]) > 0,
+                    "stats": app.test_client().get("/stats").get_json()}
+    finally:
+        server.shutdown()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    rooms = int(argv[0]) if argv else 2
+    days = int(argv[1]) if len(argv) > 1 else 1
+    result = run_check(rooms, days)
+    if not result["ok"]:
+        print(f"FAIL: pipeline against the stand-in: {result.get('error')}")
+        return 1
+    print(f"OK: pipeline ran against the stand-in ({result['stats']['requests']} requests)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
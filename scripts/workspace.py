@@ -0,0 +1,84 @@
+import os
+import re
+import shutil
+import threading
+import uuid
+
+# A workspace is a directory with the usual data/ + exports/ layout.
+# "default" is the repository root itself, so single-user setups keep
+# finding their files where they always were.
+WORKSPACES_FOLDER = "workspaces"
+DEFAULT_WORKSPACE = "default"
+RUN_HISTORY_LIMIT = 20  # per-run output folders kept per workspace
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def is_valid_name(name):
+    return bool(name) and bool(_NAME.match(name))
+
+
+def workspace_root(workspace_id=None):
+    workspace_id = workspace_id or DEFAULT_WORKSPACE
+    if not is_valid_name(workspace_id):
+        raise ValueError(f"Invalid workspace id: {workspace_id!r}")
+    if workspace_id == DEFAULT_WORKSPACE:
+        return "."
+    return os.path.join(WORKSPACES_FOLDER, workspace_id)
+
+
+def workspace_paths(root):
+    return {
+        "root": root,
+        "rooms": os.path.join(root, "data", "rooms"),
+        "layout": os.path.join(root, "data", "saved_layout.json"),
+        "parsed": os.path.join(root, "exports", "parsed_json"),
+        "columnar": os.path.join(root, "exports", "columnar"),
+        "manifest": os.path.join(root, "exports", "manifest.json"),
+        "runs": os.path.join(root, "exports", "runs"),
+        # Latest finished run, published here for people browsing exports/
+        "llm_result": os.path.join(root, "exports", "prompt_result", "llm_resilt.json"),
+        "pdf": os.path.join(root, "exports", "final_result", "output.pdf"),
+    }
+
+
+def ensure_workspace(root):
+    paths = workspace_paths(root)
+    for key in ("rooms", "parsed", "columnar", "runs"):
+        os.makedirs(paths[key], exist_ok=True)
+    return paths
+
+
+def new_run(root, run_id=None):
+    """Private output folder of one pipeline run."""
+    run_id = run_id or uuid.uuid4().hex
+    run_dir = os.path.join(workspace_paths(root)["runs"], run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    return {
+        "id": run_id,
+        "dir": run_dir,
+        "llm_result": os.path.join(run_dir, "llm_result.json"),
+        "pdf": os.path.join(run_dir, "output.pdf"),
+    }
+
+
+def prune_runs(root, keep=RUN_HISTORY_LIMIT):
+    runs_dir = workspace_paths(root)["runs"]
+    runs = sorted(
+        (e for e in os.scandir(runs_dir) if e.is_dir()),
+        key=lambda e: e.stat().st_mtime,
+    )
+    for entry in runs[:max(0, len(runs) - keep)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def workspace_lock(root):
+    """Serialises the stages that rewrite a workspace's shared files (parse outputs)."""
+    key = os.path.abspath(root)
+    with _locks_guard:
+        if key not in _locks:
+            _locks[key] = threading.Lock()
+        return _locks[key]
@@ -7,6 +7,12 @@ const API_BASE = "http://127.0.0.1:5000";
 const GRID = 20;                // grid size for grid snapping (user selected B)
 const MAGNETIC_DIST = 16;       // distance to magnetically snap to other rooms
 const MIN_W = 40, MIN_H = 30;   // minimum room size
+/* Server-side workspace of this browser: keeps its rooms/results apart from other users */
+const WORKSPACE = localStorage.getItem("sonalyzeWorkspace") || (() => {
+  const id = "ws_" + Math.random().toString(36).slice(2, 12);
+  localStorage.setItem("sonalyzeWorkspace", id);
+  return id;
+})();
 const roomCounters = {
     Bedroom: 0,
     Bathroom: 0,
@@ -455,7 +461,7 @@ async function saveLayout() {
   try {
     const res = await fetch(API_BASE + "/layout/save", {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: { "Content-Type": "application/json", "X-Workspace": WORKSPACE },
       body: JSON.stringify({ layout: rooms })
     });
     const j = await res.json();
@@ -582,6 +588,7 @@ document.getElementById("saveRoomData").onclick = async () => {
     try {
         const res = await fetch("http://127.0.0.1:5000/room/data", {
             method: "POST",
+            headers: { "X-Workspace": WORKSPACE },
             body: form,
         });
 
@@ -630,8 +637,47 @@ document.addEventListener("keydown", (e) => {
 
 
 document.getElementById("runScriptsBtn").addEventListener("click", async () => {
-    const res = await fetch("/run-scripts", { method: "POST" });
+    const res = await fetch("/run-scripts", { method: "POST", headers: { "X-Workspace": WORKSPACE } });
 
     const data = await res.json();
     console.log("Server response:", data);
-});
\ No newline at end of file
+    if (!res.ok) {
+        alert("Could not start the analysis: " + (data.error || res.status));
+        return;
+    }
+    followJob(data.job_id);
+});
+
+/* Follow a background job through its event stream, then open the report */
+function followJob(jobId) {
+    const status = qs("#runStatus");
+    const events = new EventSource("/jobs/" + jobId + "/events");
+    let rooms = 0;
+
+    events.addEventListener("stage", (e) => {
+        const d = JSON.parse(e.data);
+        status.textContent = "Stage: " + d.stage;
+    });
+    events.addEventListener("room_done", (e) => {
+        const d = JSON.parse(e.data);
+        rooms += 1;
+        status.textContent = "Analysed " + rooms + "/" + d.total + " rooms (" + d.file + ")";
+    });
+    events.addEventListener("token", (e) => {
+        console.log(JSON.parse(e.data).text);
+    });
+    events.addEventListener("status", (e) => {
+        const d = JSON.parse(e.data);
+        if (d.status === "done") {
+            events.close();
+            status.textContent = "Report ready";
+            window.open("/jobs/" + jobId + "/pdf", "_blank");
+        } else if (d.status === "failed") {
+            events.close();
+            status.textContent = "Analysis failed";
+            alert("Analysis failed: " + d.error);
+        } else {
+            status.textContent = "Job " + d.status;
+        }
+    });
+}